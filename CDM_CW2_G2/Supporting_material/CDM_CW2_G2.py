@@ -32,10 +32,17 @@
 
 import pandas as pd
 import numpy as np
-import random
-import pycountry_convert as pc
 import json
 import secrets
+import sys
+
+# anonymisation helpers from the repo root
+sys.path.insert(0, '../..')
+from anonymisation.continent import to_continent
+from anonymisation.dates import ages
+from anonymisation.kanon import k_anonymity
+from anonymisation.reference import reference_data
+from anonymisation.sid import sample_ids, sid_key
 
 
 # ## Load data
@@ -58,16 +65,13 @@ df.head()
 
 # ## Sample IDs
 # 
-# A list of unique random numbers is generated as `sid` that distinctively identify each subject in the dataset.
+# A list of unique 10-digit numbers is generated as `sid` that distinctively identify each subject in the dataset. The numbers are a permutation of the row numbers keyed with a secret key (kept in `.sid_key`), so they never collide and the same key gives the same IDs. Ten digits leave room for 9 billion rows; `sample_ids` raises an error rather than repeat an ID when the rows do not fit.
 
 # In[3]:
 
 
-# set seed
-random.seed(23579)
-
-# list of 1000 random 7-digit integers
-sid = random.sample(range(1000000, 10000000), 1000)
+# list of unique 10-digit integers, one per row
+sid = sample_ids(0, len(df), sid_key())
 
 # attach sample IDs to dataset
 df.insert(0, 'sid', sid)
@@ -129,11 +133,11 @@ imp_info['gender'] = {'male': 1, 'female': 0}
 # In[8]:
 
 
-# retrieve year of birth as int
-birthyear = pd.to_datetime(df_res['birthdate']).dt.year
+# age at 2022 from the ISO birthdate (year of birth read directly, no date parsing)
+age = ages(df_res['birthdate'], 2022)
 
-# subtract to get age and divide by quartiles
-age = pd.qcut(2022 - birthyear, 4, labels = ['18-32', '33-43', '44-55', '55+'])
+# divide by quartiles
+age = pd.qcut(age, 4, labels = ['18-32', '33-43', '44-55', '55+'])
 
 # insert to df
 df_res.insert(2, 'age', age)
@@ -342,30 +346,10 @@ print(country_n)
 # In[23]:
 
 
-# define conversion function
-def country_to_continent(country_name):
-    if country_name in ['Korea', 'Palestinian Territory', 'Timor-Leste']:
-        return 'Asia'
-    elif country_name in ['Saint Barthelemy','United States Minor Outlying Islands']:
-        return 'North America'
-    elif country_name in ['Saint Helena', 'Reunion', 'Western Sahara', 'Libyan Arab Jamahiriya', "Cote d'Ivoire"]:
-        return 'Africa'
-    elif country_name in ['Antarctica (the territory South of 60 deg S)']:
-        return 'Antarctica'
-    elif country_name == 'Pitcairn Islands':
-        return 'Oceania'
-    elif country_name in ['Slovakia (Slovak Republic)', 'Holy See (Vatican City State)', 'British Indian Ocean Territory (Chagos Archipelago)', 'Bouvet Island (Bouvetoya)', 'Svalbard & Jan Mayen Islands']:
-        return 'Europe'
-    elif country_name == 'Netherlands Antilles':
-        return 'South America'
-    else:
-        country_alpha2 = pc.country_name_to_country_alpha2(country_name)
-        country_continent_code = pc.country_alpha2_to_continent_code(country_alpha2)
-        country_continent_name = pc.convert_continent_code_to_continent_name(country_continent_code)
-        return country_continent_name
-
-# apply to our data as new column
-df_gov.insert(1, 'continent_of_birth', df_gov['country_of_birth'].apply(country_to_continent))
+
+# convert with the compiled country -> continent table (pycountry_convert and the
+# override lists, see anonymisation/reference.py) and add as new column
+df_gov.insert(1, 'continent_of_birth', to_continent(df_gov['country_of_birth']))
 
 # remove original column
 df_gov = df_gov.drop(columns = 'country_of_birth')
@@ -401,8 +385,7 @@ print(area_n)
 
 
 # dictionary for conversion
-postcode_country = pd.read_csv('postcode_country.csv')
-area_to_country = dict(zip(postcode_country['Postcode area'], postcode_country['Country']))
+area_to_country = reference_data().area_to_country()
 
 # convert to UK country and add new column
 df_gov.insert(2, 'UK_region', df_gov['postcode'].replace(area_to_country))
@@ -479,14 +462,14 @@ notes = "27 records had been removed from the original dataset for security reas
 
 
 # count for each combination
-res = df_res.groupby(['gender', 'age', 'education_level']).size().reset_index(name = 'count')
-res_noel = df_res.groupby(['gender', 'age']).size().reset_index(name = 'count')
-gov = df_gov.groupby(['continent_of_birth', 'UK_region', 'education_level']).size().reset_index(name = 'count')
+res = k_anonymity(df_res, ['gender', 'age', 'education_level'])
+res_noel = k_anonymity(df_res, ['gender', 'age'])
+gov = k_anonymity(df_gov, ['continent_of_birth', 'UK_region', 'education_level'])
 
 # k = minimum count
-print('k_res:', min(res['count']), 
-      'k_res_noel:', min(res_noel['count']), 
-      'k_gov:', min(gov['count']))
+print('k_res:', res.k, 
+      'k_res_noel:', res_noel.k, 
+      'k_gov:', gov.k)
 
 
 # The `df_res` dataset is **9**-anonymous with `gender`, `age`, `education level` as quasi-identifiers, or **108**-anonymous if coding information for `education level` is not obtained.<br>
@@ -496,24 +479,18 @@ print('k_res:', min(res['count']),
 
 
 # combinations that occur only once
-gov_1 = gov.loc[gov['count'] == 1]
-len(gov_1)
+gov.histogram.get(1, 0)
 
 
 # In[33]:
 
 
-# left-join to get sid of records with unique combinations
-gov_1 = pd.merge(gov_1,df_gov, how = 'left',
-                 left_on = ['continent_of_birth', 'UK_region', 'education_level'], 
-                 right_on = ['continent_of_birth', 'UK_region', 'education_level'])
-
 # remove records with unique combinations
-df_gov = df_gov[df_gov['sid'].isin(gov_1['sid']) == False]
+df_gov = df_gov[~gov.suppress]
 
 # check k-anonymity
-gov = df_gov.groupby(['continent_of_birth', 'UK_region', 'education_level']).size().reset_index(name = 'count')
-print('k_gov:', min(gov['count']))
+gov = k_anonymity(df_gov, ['continent_of_birth', 'UK_region', 'education_level'])
+print('k_gov:', gov.k)
 
 
 # After removing the 27 records, the dataset is 2-anonymous.
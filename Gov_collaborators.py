@@ -1,8 +1,10 @@
 import pandas as pd
 import numpy as np
-import random
-import matplotlib.pyplot as plt
-import pycountry_convert as pc
+from anonymisation.continent import to_continent
+from anonymisation.diversity import privacy_report
+from anonymisation.kanon import k_anonymity
+from anonymisation.reference import reference_data
+from anonymisation.sid import sample_ids, sid_key
 
 # define path
 PATH = 'CDM_CW2_G2/Data/customer_information.csv'
@@ -14,16 +16,8 @@ df = pd.read_csv(PATH)
 df.head()
 df.shape
 
-# set seed
-random.seed(0)
-
-# generate sample id
-sample_ID = np.random.randint(10000, 99999, size=1000)
-sample_ID = sample_ID.tolist()
-for i in range(1000):
-    sample_ID[i] = '000' + str(sample_ID[i])
-
-df["sid"] = sample_ID
+# generate sample id (keyed permutation of the row number: unique, same for the same key)
+df["sid"] = sample_ids(0, len(df), sid_key())
 
 ############### only keep geographic and education characteristics ###############
 df_ns = df[['sid', 'country_of_birth', 'postcode', 'cc_status', 'education_level']]
@@ -32,29 +26,8 @@ df_ns = df[['sid', 'country_of_birth', 'postcode', 'cc_status', 'education_level
 df_ns['country_of_birth'].describe()
 cb_count = df_ns.groupby(['country_of_birth']).size().reset_index(name='count')
 cb_count
-# define functional for converting country to continent
-def country_to_continent(country_name):
-    if country_name in ['Korea', 'Palestinian Territory', 'Timor-Leste']:
-        return 'Asia'
-    elif country_name in ['Saint Barthelemy','United States Minor Outlying Islands']:
-        return 'North America'
-    elif country_name in ['Saint Helena', 'Reunion', 'Western Sahara', 'Libyan Arab Jamahiriya', "Cote d'Ivoire"]:
-        return 'Africa'
-    elif country_name in ['Antarctica (the territory South of 60 deg S)']:
-        return 'Antarctica'
-    elif country_name == 'Pitcairn Islands':
-        return 'Oceania'
-    elif country_name in ['Slovakia (Slovak Republic)', 'Holy See (Vatican City State)', 'British Indian Ocean Territory (Chagos Archipelago)', 'Bouvet Island (Bouvetoya)', 'Svalbard & Jan Mayen Islands']:
-        return 'Europe'
-    elif country_name == 'Netherlands Antilles':
-        return 'South America'
-    else:
-        country_alpha2 = pc.country_name_to_country_alpha2(country_name)
-        country_continent_code = pc.country_alpha2_to_continent_code(country_alpha2)
-        country_continent_name = pc.convert_continent_code_to_continent_name(country_continent_code)
-        return country_continent_name
-# convert
-df_ns['continent_of_birth'] = df['country_of_birth'].apply(country_to_continent)
+# convert with the compiled country -> continent table (one lookup per distinct country)
+df_ns['continent_of_birth'] = to_continent(df['country_of_birth'])
 # drop country of birth column
 df_ns = df_ns.drop(columns = 'country_of_birth')
 # check numbers in each continent
@@ -76,8 +49,7 @@ df_ns['postcode'] = df['postcode'].apply(lambda x: x[:find_first_digit(x)])
 post_count = df_ns.groupby(['postcode']).size().reset_index(name='count')
 post_count
 # get dictionary for convert to UK country
-postcode_country = pd.read_csv('CDM_CW2_G2/Supporting_material/postcode_country.csv')
-post_to_country = dict(zip(postcode_country['Postcode area'], postcode_country['Country']))
+post_to_country = reference_data().area_to_country()
 # convert to country
 df_ns['UK_region'] = df_ns['postcode'].replace(post_to_country)
 # drop postcode column
@@ -107,26 +79,23 @@ a = df_ns.groupby(['education_level']).size().reset_index(name='count')
 a
 
 ############### calculate k-anonimity ##################
-a = df_ns.groupby(['UK_region', 'continent_of_birth', 'education_level']).size().reset_index(name='count')
-b = a.loc[a['count']==1]
-a.shape
-b.shape
-# get the sid of the 27 individuals
-df_unique = pd.merge(b, df_ns,  how='left', 
-                  left_on=['UK_region', 'continent_of_birth', 'education_level'], 
-                  right_on = ['UK_region', 'continent_of_birth', 'education_level'])
-df_unique[['sid', 'count']]
+a = k_anonymity(df_ns, ['UK_region', 'continent_of_birth', 'education_level'])
+# number of combinations that occur only once
+a.histogram.get(1, 0)
+# the 27 individuals with a unique combination
+df_ns.loc[a.suppress, 'sid']
 # remove
-df_ns = df_ns[df_ns['sid'].isin(df_unique['sid']) == False]
+df_ns = df_ns[~a.suppress]
 
 # 2-anonymity
-a = df_ns.groupby(['UK_region', 'continent_of_birth', 'education_level']).size().reset_index(name='count')
-a['count'].min()
-
-##### example for l-diversity
-groups = a.loc[a['count'] == 5]
-tmp = df_ns[(df_ns["UK_region"] == 'Scotland') & (df_ns["continent_of_birth"] == 'Africa') & (df_ns['education_level'] == 'postgraduate')]
-tmp
+a = k_anonymity(df_ns, ['UK_region', 'continent_of_birth', 'education_level'])
+a.k
+
+##### l-diversity and t-closeness of cc_status for every group
+p = privacy_report(df_ns, ['UK_region', 'continent_of_birth', 'education_level'], 'cc_status', k=2, l=2, t=0.2)
+p.l_distinct, p.l_entropy, p.t
+# groups where everyone has the same cc_status, or whose mix is far from the overall one
+p.violations
 
 # save CSVs
 # sensitive file: same as the sensitive_info file for researchers, but with sid column
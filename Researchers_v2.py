@@ -1,14 +1,13 @@
 # load packages
 import pandas as pd
 import numpy as np
-import random
-import matplotlib.pyplot as plt
-from faker import Faker
-import pycountry_convert as pc
 import json
-
-# generate object for making fake data for UK
-faker = Faker(['en_GB'])
+from anonymisation.continent import V2_OVERRIDES, to_continent
+from anonymisation.dates import ages
+from anonymisation.postcode import outward_area
+from anonymisation.pseudonym import domain, pseudonymise
+from anonymisation.sid import sample_ids, sid_key
+from anonymisation.surrogate import pseudonymise_postcodes
 
 # define path of data file
 PATH = './Data/customer_information.csv'
@@ -20,16 +19,8 @@ df = pd.read_csv(PATH)
 df.head()
 df.shape
 
-# set seed
-random.seed(0)
-
-# generate sample id
-sample_ID = np.random.randint(10000, 99999, size=1000)
-sample_ID = sample_ID.tolist()
-for i in range(1000):
-    sample_ID[i] = '000' + str(sample_ID[i])
-
-df["sid"] = sample_ID
+# generate sample id (keyed permutation of the row number: unique, same for the same key)
+df["sid"] = sample_ids(0, len(df), sid_key())
 
 # dataset with sid and sensitive PII
 df_s = df[['sid', 'given_name', 'surname', 'phone_number', 'national_insurance_number', 'bank_account_number']]
@@ -65,86 +56,43 @@ imp_info['education_level'] = el_code
 df_ns['country_of_birth'].describe()
 cb_count = df_ns.groupby(['country_of_birth']).size().reset_index(name='count')
 cb_count
-# define functional for converting country to continent
-def country_to_continent(country_name):
-    if country_name in ['Korea', 'Palestinian Territory', 'Timor-Leste']:
-        return 'Asia'
-    elif country_name in ['Saint Barthelemy','United States Minor Outlying Islands']:
-        return 'North America'
-    elif country_name in ['Saint Helena', 'Reunion', 'Western Sahara', 'Libyan Arab Jamahiriya', "Cote d'Ivoire"]:
-        return 'Africa'
-    elif country_name in ['Antarctica (the territory South of 60 deg S)','Bouvet Island (Bouvetoya)']:
-        return 'Antarctica'
-    elif country_name == 'Svalbard & Jan Mayen Islands':
-        return 'the Arctic Ocean'
-    elif country_name == 'Pitcairn Islands':
-        return 'Oceania'
-    elif country_name in ['Slovakia (Slovak Republic)', 'Holy See (Vatican City State)']:
-        return 'Europe'
-    elif country_name == 'British Indian Ocean Territory (Chagos Archipelago)':
-        return 'Indian Ocean'
-    elif country_name == 'Netherlands Antilles':
-        return 'South America'
-    else:
-        country_alpha2 = pc.country_name_to_country_alpha2(country_name)
-        country_continent_code = pc.country_alpha2_to_continent_code(country_alpha2)
-        country_continent_name = pc.convert_continent_code_to_continent_name(country_continent_code)
-        return country_continent_name
-# convert
-df_ns['continent_of_birth'] = df_ns['country_of_birth'].apply(country_to_continent)
+# convert: one lookup per distinct country in the continent table, with this
+# script's own overrides (Svalbard -> the Arctic Ocean, British Indian Ocean
+# Territory -> Indian Ocean, Bouvet Island -> Antarctica; see continent.V2_OVERRIDES)
+df_ns['continent_of_birth'] = to_continent(df_ns['country_of_birth'], V2_OVERRIDES).astype(object)
 # check numbers in each continent
 n = df_ns.groupby(['continent_of_birth']).size().reset_index(name='count')
 print(n)
 
 ############ country_names --> code ##############
-# unique country_names
-unique_country_names = df_ns['country_of_birth'].unique()
-n = unique_country_names.size
-# code country of birth using random numbers
-country_codes = np.random.randint(100, 999, size = n)
-country_dict = dict(zip(unique_country_names, country_codes.tolist()))
-# replace country names with codes
-df_ns['country_of_birth'] = df_ns['country_of_birth'].replace(country_dict)
+# keyed codes: the same country always gets the same code for the same key, and
+# two countries never share one (codes are a keyed permutation of the positions
+# in the fixed country list of pseudonym_domains.json, shared with the pipeline)
+country_domain = domain('country_of_birth')
+df_ns['country_of_birth'], country_dict = pseudonymise(df_ns['country_of_birth'], sid_key(), 100, 1000,
+                                                       domain = country_domain)
 # add coding info into dictionary
 imp_info['country_of_birth'] = country_dict
 
 ################ continent_names --> code ##############
-# unique contient_names
-unique_continent_names = df_ns['continent_of_birth'].unique()
-n = unique_continent_names.size
-# code place of birth using random numbers
-continent_codes = np.random.randint(10, 99, size = n)
-continent_dict = dict(zip(unique_continent_names, continent_codes.tolist()))
-# replace continent names with codes
-df_ns['continent_of_birth'] = df_ns['continent_of_birth'].replace(continent_dict)
+# same for continents (the list includes the two oceans V2_OVERRIDES maps to)
+continent_domain = domain('continent_of_birth')
+df_ns['continent_of_birth'], continent_dict = pseudonymise(df_ns['continent_of_birth'], sid_key(), 10, 100,
+                                                           domain = continent_domain)
 # add coding info into dictionary
-imp_info['continent_of_birth'] = country_dict
+imp_info['continent_of_birth'] = continent_dict
 
 ################ postcode --> banding --> replace with fake postcode ################
-# define function for finding the index of the first digit in a string
-def find_first_digit(s):
-    for i, c in enumerate(s):
-        if c.isdigit():
-            return i
-            break
 # keep characters before the first digit
-df_ns['postcode'] = df['postcode'].apply(lambda x: x[:find_first_digit(x)])
-# unique postcodes
-unique_postcode = df_ns['postcode'].unique()
-# generate fake postcodes for each unique postcode
-replace_postcode = {}
-for i in unique_postcode:
-    replace_postcode[i] = faker.postcode()
-replace_postcode
-# replace the column in data set
-df_ns['postcode'] = df_ns['postcode'].replace(replace_postcode)
+df_ns['postcode'] = outward_area(df['postcode'])
+# replace each area with its own fake postcode (distinct surrogates drawn in one go)
+df_ns['postcode'], replace_postcode = pseudonymise_postcodes(df_ns['postcode'])
 # store coding info in dictionary
 imp_info['postcode'] = replace_postcode
 
 ############# birthdate --> age --> standardise ###########
 # convert to age
-birthyear = pd.to_datetime(df['birthdate']).dt.year
-df_ns['age'] = 2022 - birthyear
+df_ns['age'] = ages(df['birthdate'], 2022)
 df_ns = df_ns.drop(columns = ['birthdate'])
 # define function for standardisation
 def std(x):
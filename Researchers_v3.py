@@ -1,10 +1,9 @@
 # load packages
 import pandas as pd
 import numpy as np
-import random
-import matplotlib.pyplot as plt
-import pycountry_convert as pc
 import json
+from anonymisation.dates import ages
+from anonymisation.sid import sample_ids, sid_key
 
 # define path of data file
 PATH = 'CDM_CW2_G2/Data/customer_information.csv'
@@ -16,16 +15,8 @@ df = pd.read_csv(PATH)
 df.head()
 df.shape
 
-# set seed
-random.seed(0)
-
-# generate sample id
-sample_ID = np.random.randint(10000, 99999, size=1000)
-sample_ID = sample_ID.tolist()
-for i in range(1000):
-    sample_ID[i] = '000' + str(sample_ID[i])
-
-df["sid"] = sample_ID
+# generate sample id (keyed permutation of the row number: unique, same for the same key)
+df["sid"] = sample_ids(0, len(df), sid_key())
 
 # dataset with sid and sensitive PII
 df_s = df[['sid', 'given_name', 'surname', 'phone_number', 'national_insurance_number', 'bank_account_number']]
@@ -70,8 +61,7 @@ imp_info['blood_group'] = bg_code
 
 ############# birthdate --> age --> banding ###########
 # convert to age
-birthyear = pd.to_datetime(df['birthdate']).dt.year
-df_ns['age'] = 2022 - birthyear
+df_ns['age'] = ages(df['birthdate'], 2022)
 df_ns = df_ns.drop(columns = ['birthdate'])
 # by quartile
 df_ns['age'] = pd.qcut(df_ns['age'], 4, labels = ['18-32', '33-43', '44-55', '55+'])
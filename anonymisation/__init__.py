@@ -0,0 +1 @@
+# helpers for anonymising customer_information.csv at scale
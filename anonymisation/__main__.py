@@ -0,0 +1,68 @@
+# python -m anonymisation PROFILE ...: one entry point for the release
+# profiles of the scripts; arguments are parsed before anything heavy is
+# imported, and only the modules of the chosen mode (full run or delta) are
+# loaded, so --help and small scheduled runs start quickly
+import argparse
+
+
+# profile names as in the scripts -> pipeline profiles
+# (researchers is the dataset of the CDM_CW2_G2 notebook: letter codes, _std
+# column names)
+PROFILES = {'researchers': 'researchers',
+            'researchers-v2': 'researchers_v2',
+            'researchers-v3': 'researchers_v3',
+            'government': 'government',
+            'direct-identifiers': 'direct_identifiers'}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m anonymisation',
+                                     description='write the release datasets of customer_information')
+    parser.add_argument('profiles', nargs='+', choices=sorted(PROFILES))
+    parser.add_argument('--input', help='CSV, Parquet or Arrow extract (default: the coursework data)')
+    parser.add_argument('--delta', help='append this extract of new/changed customers instead of a full run')
+    parser.add_argument('--state-dir', default='anonymisation_state', help='state kept between delta runs')
+    parser.add_argument('--out-dir', default='.')
+    parser.add_argument('--format', default='csv', choices=['csv', 'parquet', 'arrow'], help='output format')
+    parser.add_argument('--chunksize', type=int)
+    # full runs only: a delta is appended to a release whose coding, age
+    # reference and band edges were fixed by the run that started it
+    full = parser.add_argument_group('full runs only')
+    full.add_argument('--coded', action='store_true', help='write coded columns as small integers')
+    full.add_argument('--profile-report', help='measure every stage and write a JSON report here')
+    full.add_argument('--reference', help='age reference: a year (year difference) or a YYYY-MM-DD date (exact age)')
+    full.add_argument('--age-bands', choices=['fixed', 'quartiles'],
+                      help='fixed coursework edges, or quartiles of the extract computed in an extra scan')
+    args = parser.parse_args(argv)
+    names = [PROFILES[p] for p in args.profiles]
+    full_only = [flag for flag, value in [('--coded', args.coded), ('--profile-report', args.profile_report),
+                                          ('--reference', args.reference), ('--age-bands', args.age_bands)] if value]
+
+    if args.delta:
+        if full_only:
+            parser.error('%s cannot be used with --delta' % ', '.join(full_only))
+        from anonymisation.incremental import update
+        kwargs = {} if args.chunksize is None else {'chunksize': args.chunksize}
+        n, held = update(args.delta, args.out_dir, args.state_dir, names, args.format, **kwargs)
+        print('rows:', n, 'held back:', held)
+        return
+    from anonymisation.pipeline import run
+    kwargs = {} if args.input is None else {'path': args.input}
+    if args.chunksize is not None:
+        kwargs['chunksize'] = args.chunksize
+    if args.reference is not None:
+        kwargs['reference'] = int(args.reference) if args.reference.isdigit() else args.reference
+    if args.age_bands == 'quartiles':
+        kwargs['age_bins'] = 'quartiles'
+    profiler = None
+    if args.profile_report:
+        from anonymisation.profiling import Profiler
+        profiler = Profiler()
+    n, removed = run(names, args.out_dir, fmt=args.format, coded=args.coded, profiler=profiler, **kwargs)
+    if profiler is not None:
+        profiler.write(args.profile_report)
+    print('rows:', n, 'removed:', removed)
+
+
+if __name__ == '__main__':
+    main()
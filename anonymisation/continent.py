@@ -0,0 +1,111 @@
+# country -> continent as a lookup table: built once from pycountry_convert and
+# the override lists of CDM_CW2_G2.py, cached to disk, and applied to the
+# distinct values of a column rather than to every row
+import csv
+import os
+
+from anonymisation.loader import recode
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+TABLE_PATH = os.path.join(ROOT, 'CDM_CW2_G2', 'Supporting_material', 'country_continent.csv')
+
+# countries pycountry_convert does not know (or places differently)
+OVERRIDES = {}
+for continent, countries in [
+        ('Asia', ['Korea', 'Palestinian Territory', 'Timor-Leste']),
+        ('North America', ['Saint Barthelemy', 'United States Minor Outlying Islands']),
+        ('Africa', ['Saint Helena', 'Reunion', 'Western Sahara', 'Libyan Arab Jamahiriya', "Cote d'Ivoire"]),
+        ('Antarctica', ['Antarctica (the territory South of 60 deg S)']),
+        ('Oceania', ['Pitcairn Islands']),
+        ('Europe', ['Slovakia (Slovak Republic)', 'Holy See (Vatican City State)',
+                    'British Indian Ocean Territory (Chagos Archipelago)', 'Bouvet Island (Bouvetoya)',
+                    'Svalbard & Jan Mayen Islands']),
+        ('South America', ['Netherlands Antilles'])]:
+    for country in countries:
+        OVERRIDES[country] = continent
+
+
+# Researchers_v2.py places three territories elsewhere: on the oceans they lie
+# in, and Bouvet Island in Antarctica
+V2_OVERRIDES = dict(OVERRIDES, **{'Svalbard & Jan Mayen Islands': 'the Arctic Ocean',
+                                  'British Indian Ocean Territory (Chagos Archipelago)': 'Indian Ocean',
+                                  'Bouvet Island (Bouvetoya)': 'Antarctica'})
+
+
+# same conversion as country_to_continent() in the scripts, for a single name
+def lookup_continent(country_name):
+    if country_name in OVERRIDES:
+        return OVERRIDES[country_name]
+    import pycountry_convert as pc
+    country_alpha2 = pc.country_name_to_country_alpha2(country_name)
+    country_continent_code = pc.country_alpha2_to_continent_code(country_alpha2)
+    return pc.convert_continent_code_to_continent_name(country_continent_code)
+
+
+# every country name pycountry_convert knows, plus the overrides
+def build_table():
+    import pycountry_convert as pc
+    table = {}
+    for country_name in pc.map_countries():
+        try:
+            table[country_name] = lookup_continent(country_name)
+        except KeyError:
+            # territories without a continent code
+            continue
+    table.update(OVERRIDES)
+    return table
+
+
+def save_table(table, path=TABLE_PATH):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Country', 'Continent'])
+        writer.writerows(sorted(table.items()))
+
+
+def read_table(path=TABLE_PATH):
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        next(reader)
+        return {country: continent for country, continent in reader}
+
+
+_table = None
+
+
+# table cached in memory and on disk, built on first use; the default table
+# comes from the compiled reference data (see reference.py)
+def continent_table(path=TABLE_PATH):
+    global _table
+    if _table is None:
+        if path == TABLE_PATH:
+            from anonymisation.reference import reference_data
+            _table = reference_data().continent_table()
+        elif os.path.exists(path):
+            _table = read_table(path)
+        else:
+            _table = build_table()
+            save_table(_table, path)
+    return _table
+
+
+# convert a column of country names: one lookup per distinct country in the
+# reference arrays, then the result is spread back to the rows through the
+# categorical codes; `overrides` (e.g. V2_OVERRIDES) replaces the continent of
+# the countries it lists
+def to_continent(countries, overrides=None):
+    from anonymisation.reference import reference_data
+    countries = countries.astype('category')
+    categories = countries.cat.categories
+    found = reference_data().lookup(categories, 'country')
+    table = continent_table()
+    mapping = {}
+    for c, continent in zip(categories, found):
+        if continent is None:
+            # names missing from the reference data are looked up once and kept
+            if c not in table:
+                table[c] = lookup_continent(c)
+            continent = table[c]
+        mapping[c] = overrides.get(c, continent) if overrides else continent
+    return recode(countries, mapping)
@@ -0,0 +1,157 @@
+# birthdate -> age without format inference: the extract stores dates as
+# YYYY-MM-DD, so year, month and day are read straight off a byte matrix, the
+# age is integer arithmetic against a reference date, and the bands are fixed
+# edges that can be computed once (from a histogram of ages, see
+# streaming.age_edges) and applied to every chunk
+import datetime
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+
+# age reference of the coursework: year of the extract, ages are year differences
+REFERENCE = 2022
+
+Dates = namedtuple('Dates', ['year', 'month', 'day'])
+
+# byte positions of the digits in YYYY-MM-DD
+_DIGITS = [0, 1, 2, 3, 5, 6, 8, 9]
+
+
+# the strings as an n x 10 byte matrix, or None if they are not all 10 bytes;
+# Arrow-backed strings are viewed in place (no Python objects are made)
+def _byte_matrix(dates):
+    if isinstance(dates.dtype, pd.StringDtype) and dates.dtype.storage == 'pyarrow':
+        import pyarrow as pa
+        arr = pa.array(dates) if len(dates) else None
+        if isinstance(arr, pa.ChunkedArray):
+            arr = arr.combine_chunks()
+        if arr is not None and arr.null_count == 0:
+            offsets_type = np.int64 if pa.types.is_large_string(arr.type) else np.int32
+            _, offsets, data = arr.buffers()
+            offsets = np.frombuffer(offsets, offsets_type)[arr.offset:arr.offset + len(arr) + 1]
+            if (np.diff(offsets) == 10).all():
+                return np.frombuffer(data, np.uint8)[offsets[0]:offsets[-1]].reshape(len(arr), 10)
+        return None
+    try:
+        b = dates.to_numpy(dtype=object).astype('S10')
+    except (UnicodeEncodeError, TypeError):
+        return None
+    if len(b) and b.dtype.itemsize != 10:
+        return None
+    return b.view(np.uint8).reshape(len(b), 10)
+
+
+# days in each month of a non-leap year
+_MONTH_DAYS = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+
+# rows whose month or day does not exist (month 13, 31 April, 29 February of a
+# non-leap year)
+def _invalid(year, month, day):
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    days = _MONTH_DAYS[np.clip(month, 1, 12) - 1] + ((month == 2) & leap)
+    return (month < 1) | (month > 12) | (day < 1) | (day > days)
+
+
+def _unparsed(dates, bad):
+    values = sorted(set(pd.Series(dates.to_numpy(dtype=object)[bad]).astype(str)))
+    return ValueError('%s: %d dates are not valid YYYY-MM-DD dates: %s' % (dates.name, int(bad.sum()), values[:10]))
+
+
+# year, month and day of ISO dates as integer arrays; a categorical column is
+# parsed per category; anything not in YYYY-MM-DD form (e.g. with a time, or
+# missing) falls back to to_datetime with the ISO 8601 format, with NaN for the
+# missing dates; dates that do not parse or do not exist are an error rather
+# than silently missing
+def parse_iso(dates):
+    if isinstance(dates.dtype, pd.CategoricalDtype):
+        parsed = parse_iso(pd.Series(dates.cat.categories.to_numpy(dtype=object), name=dates.name))
+        codes = dates.cat.codes.to_numpy()
+        if (codes < 0).any():
+            parsed = Dates(*[np.append(p.astype('float64'), np.nan) for p in parsed])
+        return Dates(*[p[codes] for p in parsed])
+    m = _byte_matrix(dates)
+    ok = m is not None
+    if ok:
+        # uint8 arithmetic wraps, so anything below '0' fails the <= 9 check too
+        digits = m[:, _DIGITS] - np.uint8(ord('0'))
+        ok = (digits <= 9).all() and (m[:, [4, 7]] == ord('-')).all()
+    if not ok:
+        parsed = pd.to_datetime(pd.Series(dates.to_numpy(dtype=object)), format='ISO8601', errors='coerce')
+        bad = (parsed.isna() & dates.notna()).to_numpy()
+        if bad.any():
+            raise _unparsed(dates, bad)
+        return Dates(parsed.dt.year.to_numpy(), parsed.dt.month.to_numpy(), parsed.dt.day.to_numpy())
+    d = digits.T.astype(np.int64)
+    year = ((d[0] * 10 + d[1]) * 10 + d[2]) * 10 + d[3]
+    month, day = d[4] * 10 + d[5], d[6] * 10 + d[7]
+    bad = _invalid(year, month, day)
+    if bad.any():
+        raise _unparsed(dates, bad)
+    return Dates(year, month, day)
+
+
+# age at the reference: with a year (the default) the difference of years as in
+# the coursework scripts, with a date (or 'YYYY-MM-DD') the exact age in
+# completed years
+def age_at(dates, reference=REFERENCE):
+    if isinstance(reference, (int, np.integer)):
+        return reference - dates.year
+    if not isinstance(reference, (datetime.date, pd.Timestamp)):
+        reference = pd.Timestamp(reference)
+    before = dates.month * 100 + dates.day > reference.month * 100 + reference.day
+    return reference.year - dates.year - before
+
+
+# ages of a birthdate column as a Series
+def ages(birthdates, reference=REFERENCE):
+    return pd.Series(age_at(parse_iso(birthdates), reference), index=birthdates.index, name='age')
+
+
+# the edges qcut(ages, q) would use, from a histogram of integer ages
+# (np.bincount, summed over chunks): quantiles by linear interpolation of the
+# order statistics; the outer edges are opened so every later age has a band
+def quantile_edges(counts, q=4):
+    counts = np.asarray(counts)
+    n = counts.sum()
+    if n == 0:
+        raise ValueError('no ages to compute band edges from')
+    cum = np.cumsum(counts)
+    pos = (n - 1) * np.linspace(0, 1, q + 1)
+    lo = np.searchsorted(cum, np.floor(pos), side='right')
+    hi = np.searchsorted(cum, np.ceil(pos), side='right')
+    edges = lo + (pos - np.floor(pos)) * (hi - lo)
+    edges[0], edges[-1] = -np.inf, np.inf
+    return edges
+
+
+# labels of the integer ages in each band (lo, hi]: '<=32', '33-43', '56+'
+def edge_labels(edges):
+    labels = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        first = None if np.isinf(lo) else int(np.floor(lo)) + 1
+        last = None if np.isinf(hi) else int(np.floor(hi))
+        if first is None:
+            labels.append('<=%d' % last)
+        elif last is None:
+            labels.append('%d+' % first)
+        elif first < last:
+            labels.append('%d-%d' % (first, last))
+        elif first == last:
+            labels.append('%d' % first)
+        else:
+            # no integer age falls in the band
+            labels.append('(%g, %g]' % (lo, hi))
+    return labels
+
+
+# band ages with fixed edges (bins closed on the right, as cut/qcut); ages
+# outside every band or missing get no band
+def band(ages, edges, labels):
+    ages = np.asarray(ages, dtype='float64')
+    inner = np.asarray(edges[1:-1], dtype='float64')
+    codes = np.searchsorted(inner, ages, side='left')
+    codes[np.isnan(ages) | (ages <= edges[0]) | (ages > edges[-1])] = -1
+    return pd.Categorical.from_codes(codes, labels)
@@ -0,0 +1,65 @@
+# l-diversity (distinct and entropy) and t-closeness of a sensitive attribute
+# (cc_status) for every equivalence class, from the same packed quasi-identifier
+# keys as the k-anonymity counts: one grouping pass builds a class x value count
+# matrix and every measure is computed on it vectorised
+from collections import namedtuple
+
+import numpy as np
+
+from anonymisation.kanon import column_codes, pack_keys
+
+
+# k, l_distinct, l_entropy: smallest value over the classes
+# t: largest distance of a class distribution from the overall one
+# classes: one row per class (quasi-identifiers, size, distinct, entropy_l, t)
+# violations: the classes failing any of the requested thresholds
+Privacy = namedtuple('Privacy', ['k', 'l_distinct', 'l_entropy', 't', 'classes', 'violations'])
+
+
+# counts of each sensitive value in each class; returns the matrix and, per
+# class, the index of one of its rows (to read its quasi-identifier values)
+def class_value_counts(df, qi, sensitive):
+    keys, _ = pack_keys(df, qi)
+    _, first, cls = np.unique(keys, return_index=True, return_inverse=True)
+    values, m = column_codes(df[sensitive])
+    counts = np.bincount(cls * m + values, minlength=len(first) * m).reshape(len(first), m)
+    return counts, first
+
+
+# total variation distance (the earth mover's distance with equal ground
+# distances between categories) of each row of p from q
+def variational_distance(p, q):
+    return 0.5 * np.abs(p - q).sum(axis=1)
+
+
+# thresholds: k on class size, l on distinct values, l_entropy on exp(entropy)
+# and t on the distance from the overall distribution (None = not checked);
+# an empty table has no classes (k = 0, as kanon.k_anonymity)
+def privacy_report(df, qi, sensitive='cc_status', k=2, l=2, l_entropy=None, t=None):
+    if len(df) == 0:
+        classes = df[qi].reset_index(drop=True).assign(size=np.zeros(0, dtype='int64'),
+                                                       distinct_l=np.zeros(0, dtype='int64'),
+                                                       entropy_l=np.zeros(0), t=np.zeros(0))
+        return Privacy(0, 0, 0.0, 0.0, classes, classes)
+    counts, first = class_value_counts(df, qi, sensitive)
+    size = counts.sum(axis=1)
+    p = counts / size[:, None]
+    distinct = (counts > 0).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        entropy = -np.where(p > 0, p * np.log(p), 0.0).sum(axis=1)
+    entropy_l = np.exp(entropy)
+    overall = counts.sum(axis=0) / counts.sum()
+    distance = variational_distance(p, overall)
+
+    classes = df[qi].iloc[first].reset_index(drop=True)
+    classes['size'] = size
+    classes['distinct_l'] = distinct
+    classes['entropy_l'] = entropy_l
+    classes['t'] = distance
+    bad = (size < k) | (distinct < l)
+    if l_entropy is not None:
+        bad |= entropy_l < l_entropy - 1e-9
+    if t is not None:
+        bad |= distance > t
+    return Privacy(int(size.min()), int(distinct.min()), float(entropy_l.min()), float(distance.max()),
+                   classes, classes[bad])
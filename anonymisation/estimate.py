@@ -0,0 +1,195 @@
+# approximate k-anonymity for choosing the quasi-identifiers: one scan keeps a
+# Bernoulli sample of the rows (every row with probability `fraction`), then
+# any candidate set of quasi-identifiers is evaluated on the sample alone with
+# the packed keys of kanon.py, so each what-if costs a count over the sample
+# instead of a pass over the extract
+#
+# from the frequencies of frequencies of the sample (f_j: classes seen j times):
+# - suppressed rows: the rows of classes smaller than the target. A sample
+#   count c of a class of s rows is Binomial(s, fraction), so the sizes of the
+#   classes are estimated by deconvolving the f_j (maximum likelihood over a
+#   grid of sizes, EM accelerated with SQUAREM, classes never seen included)
+#   and the rows of the sizes below the target are summed; this is a model
+#   estimate: with a small sample, classes of 1 and of 20 rows look alike and
+#   it can understate by far. The bound next to it does not depend on a
+#   model: every sampled row of a class below the target is in a class seen
+#   fewer than target times, so those m sample rows give at most
+#   (m + z sqrt(m (1 - fraction))) / fraction suppressed rows
+# - number of classes: Chao1 estimate d + f1^2 / (2 f2) with its log-normal
+#   interval, as classes missing from the sample are mostly small ones (Chao1
+#   is a lower estimate when many classes are tiny)
+# - k: only bounded from above by a sample: k is at most the size of the class
+#   seen least often (c times), whose upper bound solves
+#   c = s f - z_d sqrt(s f (1 - f)), with z_d widened for the d classes seen as
+#   that class is picked for its low count
+# figures are clamped to the number of rows; with fraction=1 every one is exact
+import math
+from collections import namedtuple
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from anonymisation.kanon import pack_keys
+from anonymisation.storage import read_table_chunks
+
+
+# k_at_most, suppressed_at_most: upper bounds; suppressed: model estimate;
+# classes comes with its (low, high) interval
+Estimate = namedtuple('Estimate', ['k_at_most', 'classes', 'classes_interval',
+                                   'suppressed', 'suppressed_at_most', 'rows', 'sample'])
+
+# normal quantile of the intervals (95%)
+Z = 1.96
+
+
+# Bernoulli sample of a table (columns: the candidate quasi-identifiers);
+# returns the sample and the number of rows of the table
+def sample_table(path, columns, fraction, seed=0, chunksize=1000000):
+    rng = np.random.default_rng(seed)
+    parts, rows = [], 0
+    for chunk in read_table_chunks(path, chunksize, columns=columns):
+        rows += len(chunk)
+        parts.append(chunk[rng.random(len(chunk)) < fraction])
+    sample = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=columns)
+    return sample, rows
+
+
+# Bernoulli sample of a DataFrame already in memory
+def sample_frame(df, fraction, seed=0):
+    rng = np.random.default_rng(seed)
+    return df[rng.random(len(df)) < fraction].reset_index(drop=True)
+
+
+def _chao1(counts, z):
+    d = len(counts)
+    f1 = int((counts == 1).sum())
+    f2 = int((counts == 2).sum())
+    if f1 == 0:
+        return float(d), (float(d), float(d))
+    if f2 > 0:
+        r = f1 / f2
+        extra = f1 * r / 2
+        var = f2 * (r ** 4 / 4 + r ** 3 + r ** 2 / 2)
+    else:
+        extra = f1 * (f1 - 1) / 2
+        var = extra + f1 * (2 * f1 - 1) ** 2 / 4 - f1 ** 4 / (4 * (d + extra))
+    if extra <= 0:
+        return float(d), (float(d), float(d))
+    c = np.exp(z * np.sqrt(np.log(1 + max(var, 0.0) / extra ** 2)))
+    return d + extra, (d + extra / c, d + extra * c)
+
+
+# class sizes the deconvolution can give: every size up to 200, then a
+# geometric grid up to well above the largest class seen
+def size_grid(largest, fraction, rows):
+    top = min(rows, max(10, int(3 * (largest + 10) / fraction)))
+    small = np.arange(1, min(top, 200) + 1)
+    big = np.geomspace(201, top, 300).astype('int64') if top > 200 else np.zeros(0, dtype='int64')
+    return np.unique(np.concatenate([small, big])).astype('float64')
+
+
+_lgamma = np.vectorize(math.lgamma)
+
+
+def _em_step(pi, fj, p, p0):
+    mix = pi[:, None] * p
+    seen = (mix / np.maximum(mix.sum(axis=0, keepdims=True), 1e-300) * fj[None, :]).sum(axis=1)
+    # classes never seen, in proportion to their chance of being missed
+    w = seen + fj.sum() * pi * p0 / (1 - (pi * p0).sum())
+    return w / w.sum()
+
+
+def _loglik(pi, fj, p, p0):
+    return (fj * np.log(np.maximum((pi[:, None] * p).sum(axis=0), 1e-300))).sum() - fj.sum() * np.log(1 - (pi * p0).sum())
+
+
+# number of classes of every size of the grid, from the sample counts of the
+# classes seen
+def class_sizes(counts, fraction, rows, iterations=2000, tol=1e-14):
+    j, fj = np.unique(counts, return_counts=True)
+    sizes = size_grid(j.max(), fraction, rows)
+    s, c = sizes[:, None], j[None, :].astype('float64')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        log_p = (_lgamma(s + 1) - _lgamma(c + 1) - _lgamma(np.maximum(s - c, 0) + 1)
+                 + c * np.log(fraction) + (s - c) * np.log1p(-fraction))
+    p = np.where(c <= s, np.exp(log_p), 0.0)
+    p0 = (1 - fraction) ** sizes
+    pi = np.full(len(sizes), 1 / len(sizes))
+    ll = _loglik(pi, fj, p, p0)
+    for _ in range(iterations):
+        # SQUAREM: extrapolate two EM steps, keep plain EM if that is worse
+        p1 = _em_step(pi, fj, p, p0)
+        p2 = _em_step(p1, fj, p, p0)
+        r, v = p1 - pi, p2 - 2 * p1 + pi
+        a = -np.sqrt((r * r).sum() / max((v * v).sum(), 1e-300))
+        new = np.maximum(pi - 2 * a * r + a * a * v, 0)
+        new = _em_step(new / new.sum(), fj, p, p0)
+        new_ll = _loglik(new, fj, p, p0)
+        if new_ll < ll:
+            new, new_ll = p2, _loglik(p2, fj, p, p0)
+        done = new_ll - ll < tol * abs(ll)
+        pi, ll = new, new_ll
+        if done:
+            break
+    return sizes, fj.sum() / (1 - (pi * p0).sum()) * pi
+
+
+# estimate k, the number of classes and the rows a `target` would suppress for
+# the quasi-identifiers `qi`, from a sample of `rows` rows
+def estimate_k(sample, qi, rows, target=2, z=Z):
+    n = len(sample)
+    if n == 0:
+        raise ValueError('empty sample')
+    fraction = n / rows
+    keys, _ = pack_keys(sample, qi)
+    _, counts = np.unique(keys, return_counts=True)
+    c = int(counts.min())
+    # sample rows of the classes seen fewer than target times
+    m = float(counts[counts < target].sum())
+
+    if fraction >= 1:
+        return Estimate(float(c), float(len(counts)), (float(len(counts)),) * 2, m, m, rows, n)
+
+    classes, (classes_low, classes_high) = _chao1(counts, z)
+    normal = NormalDist()
+    z_d = normal.inv_cdf(1 - (1 - normal.cdf(z)) / len(counts))
+    half = z_d * np.sqrt(1 - fraction) / 2
+    k_at_most = min((half + np.sqrt(half ** 2 + c)) ** 2 / fraction, rows)
+    suppressed_at_most = min((m + z * np.sqrt(m * (1 - fraction))) / fraction, rows)
+    suppressed = 0.0
+    if m > 0:
+        sizes, number = class_sizes(counts, fraction, rows)
+        suppressed = min(float((sizes * number)[sizes < target].sum()), suppressed_at_most)
+    return Estimate(float(k_at_most), float(min(classes, rows)),
+                    (float(min(classes_low, rows)), float(min(classes_high, rows))),
+                    suppressed, float(suppressed_at_most), rows, n)
+
+
+# estimate for every candidate set of quasi-identifiers, one row each
+def compare(sample, candidates, rows, target=2, z=Z):
+    out = []
+    for qi in candidates:
+        e = estimate_k(sample, qi, rows, target, z)
+        out.append({'qi': ', '.join(qi), 'k_at_most': e.k_at_most,
+                    'classes': e.classes, 'classes_low': e.classes_interval[0],
+                    'classes_high': e.classes_interval[1], 'suppressed': e.suppressed,
+                    'suppressed_at_most': e.suppressed_at_most})
+    return pd.DataFrame(out)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='estimate k for candidate quasi-identifier sets from a sample')
+    parser.add_argument('path', help='CSV, Parquet or Arrow table (e.g. a released dataset)')
+    parser.add_argument('--qi', nargs='+', action='append', required=True,
+                        help='one candidate set of quasi-identifiers (repeat for more)')
+    parser.add_argument('--fraction', type=float, default=0.01, help='share of rows kept in the sample')
+    parser.add_argument('--k', type=int, default=2, help='target k for the suppression count')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunksize', type=int, default=1000000)
+    args = parser.parse_args()
+    columns = sorted({c for qi in args.qi for c in qi})
+    sample, rows = sample_table(args.path, columns, args.fraction, args.seed, args.chunksize)
+    with pd.option_context('display.width', 200, 'display.max_columns', 20):
+        print(compare(sample, args.qi, rows, args.k).round(1).to_string(index=False))
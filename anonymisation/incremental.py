@@ -0,0 +1,258 @@
+# incremental anonymisation of daily deltas: the sid of every customer, the
+# coding information, the mean/sd used for the Z-scores and the equivalence
+# class counts are kept in a state directory, so a run over a delta extract
+# only processes new or changed customers, appends them to the released
+# datasets and re-checks k-anonymity for the classes the delta touches
+#
+# the mean/sd stay those of the first run (they are what coding.json holds and
+# what all released Z-scores use); the running statistics over all customers
+# seen are kept in the state as well, to decide when a full re-run is due
+#
+# rows held back because their class is smaller than k are kept in the state
+# and released as soon as enough customers join their class
+#
+# only releases started by update() can be continued: the state records the
+# size and modification time of every file it wrote, and a run refuses an
+# out_dir holding release files it did not write (e.g. from a full
+# pipeline.run, whose sids and class counts the state does not know)
+import json
+import os
+
+import pandas as pd
+
+from anonymisation import streaming
+from anonymisation.loader import read_customers
+from anonymisation.pipeline import PROFILES, ChunkColumns, run_context, select_profiles, with_age
+from anonymisation.sid import sample_ids, sid_key
+from anonymisation.stats import RunningStats
+from anonymisation.storage import TableWriter, read_table, read_table_chunks, with_format, write_table
+
+
+# column identifying a customer across extracts
+KEY = 'national_insurance_number'
+
+STATE_FILE = 'state.json'
+
+
+class State:
+
+    def __init__(self, state_dir, fmt='csv'):
+        self.dir = state_dir
+        self.fmt = fmt
+        os.makedirs(state_dir, exist_ok=True)
+        path = os.path.join(state_dir, STATE_FILE)
+        if os.path.exists(path):
+            with open(path) as fp:
+                state = json.load(fp)
+        else:
+            state = {'next_sid': 0, 'stats': None, 'running': None, 'runs': 0}
+        self.releases = state.get('releases', {})
+        self.next_sid = state['next_sid']
+        self.stats = state['stats']
+        self.running = RunningStats.from_dict(state['running']) if state['running'] else None
+        self.runs = state['runs']
+
+    def table_path(self, name):
+        return with_format(os.path.join(self.dir, name + '.csv'), self.fmt)
+
+    def read(self, name, columns=None):
+        path = self.table_path(name)
+        return read_table(path, columns=columns) if os.path.exists(path) else None
+
+    def write(self, name, df):
+        write_table(df, self.table_path(name))
+
+    def save(self):
+        state = {'next_sid': self.next_sid, 'stats': self.stats,
+                 'running': self.running.to_dict() if self.running else None, 'runs': self.runs,
+                 'releases': self.releases}
+        with open(os.path.join(self.dir, STATE_FILE), 'w') as fp:
+            json.dump(state, fp, indent = 4)
+
+
+# split the delta into new and changed customers (unchanged rows are dropped);
+# returns the rows to process with their sid and the sids they replace
+def classify_rows(delta, customers, state, key):
+    row_hash = pd.util.hash_pandas_object(delta.astype(str), index=False).to_numpy().astype('int64')
+    if customers is None:
+        customers = pd.DataFrame({KEY: pd.Series(dtype=object), 'sid': pd.Series(dtype='int64'),
+                                  'hash': pd.Series(dtype='int64')})
+    known = pd.Series(customers['sid'].to_numpy(), index=customers[KEY])
+    known_hash = pd.Series(customers['hash'].to_numpy(), index=customers[KEY])
+    sid = delta[KEY].map(known)
+    is_new = sid.isna().to_numpy()
+    changed = ~is_new & (delta[KEY].map(known_hash).to_numpy() != row_hash)
+    keep = is_new | changed
+
+    # new customers get the sample IDs of the next row numbers
+    sid = sid.to_numpy(dtype='float64', copy=True)
+    sid[is_new] = sample_ids(state.next_sid, int(is_new.sum()), key)
+    state.next_sid += int(is_new.sum())
+
+    rows = delta[keep].copy()
+    rows.insert(0, 'sid', sid[keep].astype('int64'))
+    replaced = set(rows.loc[changed[keep], 'sid'])
+
+    # updated customer table
+    update = pd.DataFrame({KEY: rows[KEY].to_numpy(), 'sid': rows['sid'].to_numpy(), 'hash': row_hash[keep]})
+    customers = pd.concat([customers[~customers[KEY].isin(update[KEY])], update], ignore_index=True)
+    return rows, replaced, customers
+
+
+# copy a released file without the rows for which drop(chunk) is True;
+# returns the dropped rows
+def _filter_release(path, drop, chunksize):
+    if not os.path.exists(path):
+        return []
+    root, ext = os.path.splitext(path)
+    tmp_path = root + '.tmp' + ext
+    dropped = []
+    with TableWriter(tmp_path) as out:
+        for chunk in read_table_chunks(path, chunksize):
+            mask = drop(chunk)
+            dropped.append(chunk[mask])
+            out.write(chunk[~mask])
+    os.replace(tmp_path, path)
+    return dropped
+
+
+# TableWriter starts new files, so columnar releases are copied chunk by chunk
+# into a new file followed by the new rows (never read whole into memory)
+def _append(path, df, chunksize):
+    if os.path.exists(path) and os.path.splitext(path)[1] != '.csv':
+        root, ext = os.path.splitext(path)
+        tmp_path = root + '.tmp' + ext
+        with TableWriter(tmp_path) as out:
+            for chunk in read_table_chunks(path, chunksize):
+                out.write(chunk)
+            out.write(df)
+        os.replace(tmp_path, path)
+    elif os.path.exists(path):
+        df.to_csv(path, mode='a', header=False, index=False)
+    else:
+        write_table(df, path)
+
+
+def _signature(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+# the release and coding files of the profiles must be exactly those the state
+# wrote (or not exist yet, if the state never wrote them)
+def check_out_dir(state, paths):
+    for path in paths:
+        known = state.releases.get(os.path.abspath(path))
+        if known is None and os.path.exists(path):
+            raise ValueError('%s was not written by an incremental run with this state; start incremental '
+                             'runs on an empty out_dir or with the state dir of the run that wrote it' % path)
+        if known is not None and (not os.path.exists(path) or _signature(path) != known):
+            raise ValueError('%s was changed since the last incremental run with this state' % path)
+
+
+def _class_index(df, qi):
+    return pd.MultiIndex.from_frame(df[qi].astype(str))
+
+
+# process one delta extract; returns the number of rows processed and, per
+# profile with k, the number of rows currently held back
+def update(delta_path, out_dir, state_dir, names=('researchers', 'government', 'direct_identifiers'),
+           fmt='csv', key=None, chunksize=streaming.CHUNKSIZE):
+    state = State(state_dir, fmt)
+    profiles = select_profiles(names)
+    paths = {name: with_format(os.path.join(out_dir, p.file + '.csv'), fmt) for name, p in profiles.items()}
+    coding_paths = {os.path.join(out_dir, p.coding_file) for p in profiles.values() if p.coding is not None}
+    check_out_dir(state, list(paths.values()) + sorted(coding_paths))
+    delta = read_customers(delta_path)
+    key = sid_key() if key is None else key
+    rows, replaced, customers = classify_rows(delta, state.read('customers'), state, key)
+
+    # mean/sd fixed at the first run, running statistics over all new rows
+    std_columns = list(streaming.STD_COLUMNS) + ['age']
+    if state.running is None:
+        state.running = RunningStats(std_columns)
+    ctx = run_context(key)
+    state.running.update(with_age(rows[~rows['sid'].isin(replaced)].copy(), ctx['reference']))
+    if state.stats is None:
+        state.stats = state.running.info()
+    ctx['stats'] = state.stats
+    cols = ChunkColumns(rows, ctx)
+
+    held = {}
+    for name, p in profiles.items():
+        path = paths[name]
+        out = cols.frame(p.columns)
+        coding_path = os.path.join(out_dir, p.coding_file)
+        if p.coding is not None and not os.path.exists(coding_path):
+            # written once: the released Z-scores all use the frozen mean/sd
+            with open(coding_path, 'w') as fp:
+                json.dump(p.coding(ctx), fp, indent = 4)
+        if not p.k:
+            if replaced:
+                _filter_release(path, lambda c: c['sid'].isin(replaced).to_numpy(), chunksize)
+            _append(path, out, chunksize)
+            continue
+
+        # class counts of all customers (released or held back)
+        counts = state.read(name + '_classes')
+        if counts is None:
+            counts = pd.DataFrame({c: pd.Series(dtype=object) for c in p.qi + ['count']})
+        counts = pd.Series(counts['count'].to_numpy(dtype='int64'), index=_class_index(counts, p.qi))
+        held_rows = state.read(name + '_held')
+        if held_rows is None:
+            held_rows = out.iloc[:0]
+
+        # changed customers leave their old class
+        old = _filter_release(path, lambda c: c['sid'].isin(replaced).to_numpy(), chunksize)
+        old = pd.concat(old + [held_rows[held_rows['sid'].isin(replaced)]], ignore_index=True)
+        held_rows = held_rows[~held_rows['sid'].isin(replaced)]
+        left = old.groupby(p.qi, observed=True).size()
+        if len(left):
+            left.index = _class_index(left.index.to_frame(index=False), p.qi)
+            counts = counts.sub(left, fill_value=0)
+
+        # new rows join their classes; only these classes can change
+        joined = out.groupby(p.qi, observed=True).size()
+        joined.index = _class_index(joined.index.to_frame(index=False), p.qi)
+        counts = counts.add(joined, fill_value=0)
+        touched = left.index.union(joined.index) if len(left) else joined.index
+        small = touched[(counts.reindex(touched) < p.k).to_numpy()]
+
+        # released rows of classes that fell below k are held back again
+        if len(left) and len(small):
+            fell = _filter_release(path, lambda c: _class_index(c, p.qi).isin(small), chunksize)
+            held_rows = pd.concat([held_rows] + fell, ignore_index=True)
+
+        # new rows and held-back rows of touched classes that now reach k
+        pool = pd.concat([held_rows, out], ignore_index=True)
+        in_touched = _class_index(pool, p.qi).isin(touched)
+        release = in_touched & ~_class_index(pool, p.qi).isin(small)
+        _append(path, pool[release][list(p.columns)], chunksize)
+        held_rows = pool[~release]
+
+        counts = counts[counts > 0]
+        state.write(name + '_classes', counts.rename('count').reset_index().set_axis(p.qi + ['count'], axis=1))
+        state.write(name + '_held', held_rows)
+        held[name] = len(held_rows)
+
+    state.write('customers', customers)
+    for path in list(paths.values()) + sorted(coding_paths):
+        if os.path.exists(path):
+            state.releases[os.path.abspath(path)] = _signature(path)
+    state.runs += 1
+    state.save()
+    return len(rows), held
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='append a delta extract to the released datasets')
+    parser.add_argument('delta', help='CSV, Parquet or Arrow extract of new/changed customers')
+    parser.add_argument('--out-dir', default='.')
+    parser.add_argument('--state-dir', default='anonymisation_state')
+    parser.add_argument('--profiles', nargs='+', default=['researchers', 'government', 'direct_identifiers'],
+                        choices=sorted(PROFILES))
+    parser.add_argument('--format', default='csv', choices=['csv', 'parquet', 'arrow'])
+    args = parser.parse_args()
+    n, held = update(args.delta, args.out_dir, args.state_dir, args.profiles, args.format)
+    print('rows:', n, 'held back:', held)
@@ -0,0 +1,118 @@
+# k-anonymity without groupby + merge + isin: every quasi-identifier
+# combination is packed into one integer key, the keys are counted with
+# np.bincount (or np.unique when the key space is large) and the class size of
+# every row comes back from the same pass
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+
+# k: size of the smallest equivalence class
+# histogram: number of equivalence classes of each size
+# sizes: size of the equivalence class of every row
+# suppress: rows in classes smaller than the target k
+KAnonymity = namedtuple('KAnonymity', ['k', 'histogram', 'sizes', 'suppress'])
+
+# largest key space counted with np.bincount, beyond that np.unique is used
+BINCOUNT_MAX = 1 << 24
+
+
+# integer codes of one column, missing values get a code of their own
+def column_codes(s):
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        codes = s.cat.codes.to_numpy().astype('int64')
+        n = len(s.cat.categories)
+    else:
+        codes, uniques = pd.factorize(s)
+        codes = codes.astype('int64')
+        n = len(uniques)
+    if (codes < 0).any():
+        codes = np.where(codes < 0, n, codes)
+        n += 1
+    return codes, max(n, 1)
+
+
+# pack the quasi-identifiers of every row into one int64 key (mixed radix);
+# returns the keys and the size of the key space
+def pack_keys(df, qi):
+    keys = np.zeros(len(df), dtype='int64')
+    space = 1
+    for c in qi:
+        codes, n = column_codes(df[c])
+        if space * n >= 2 ** 62:
+            # too many combinations for one int64: renumber the keys so far
+            keys, uniques = pd.factorize(keys)
+            keys = keys.astype('int64')
+            space = max(len(uniques), 1)
+        keys = keys * n + codes
+        space *= n
+    return keys, space
+
+
+# size of the equivalence class of every row
+def class_sizes(keys, space):
+    if space <= max(BINCOUNT_MAX, 4 * len(keys)):
+        counts = np.bincount(keys, minlength=space)
+        return counts[keys]
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    return counts[inverse]
+
+
+# k of `df` on the quasi-identifiers `qi`, plus the mask of rows to remove so
+# that the remaining data is `target`-anonymous
+def k_anonymity(df, qi, target=2):
+    if len(df) == 0:
+        return KAnonymity(0, pd.Series(dtype='int64', name='classes'),
+                          np.zeros(0, dtype='int64'), np.zeros(0, dtype=bool))
+    keys, space = pack_keys(df, qi)
+    sizes = class_sizes(keys, space)
+    # a class of size s holds s rows, so s-sized classes = rows with size s / s
+    by_size = np.bincount(sizes)
+    size = np.flatnonzero(by_size)
+    histogram = pd.Series(by_size[size] // size, index=pd.Index(size, name='size'), name='classes')
+    return KAnonymity(int(size[0]), histogram, sizes, sizes < target)
+
+
+# class sizes over a table written chunk by chunk: every row's class id is
+# appended to a file that is memory-mapped afterwards, so suppression is a
+# boolean mask read slice by slice while the rows are copied, with no join
+# on the quasi-identifiers or sid and no copy of the table in memory
+class ClassCounter:
+
+    def __init__(self, qi, path):
+        self.qi = list(qi)
+        self.path = path
+        self.classes = {}
+        self.rows = 0
+        self._file = open(path, 'wb')
+        self._ids = None
+        self._sizes = None
+
+    # assign the rows of a chunk to their classes (ids shared by all chunks)
+    def add(self, chunk):
+        codes, uniques = pd.factorize(pd.MultiIndex.from_frame(chunk[self.qi].astype(object)), use_na_sentinel=False)
+        lookup = np.array([self.classes.setdefault(u, len(self.classes)) for u in uniques], dtype='int64')
+        lookup[codes].tofile(self._file)
+        self.rows += len(chunk)
+
+    # size of every class, once all chunks are added
+    def sizes(self):
+        if self._sizes is None:
+            self._file.close()
+            self._ids = np.memmap(self.path, dtype='int64', mode='r') if self.rows else np.zeros(0, dtype='int64')
+            self._sizes = np.bincount(self._ids, minlength=len(self.classes))
+        return self._sizes
+
+    # rows start .. stop - 1 to keep for a target k
+    def keep(self, start, stop, target):
+        sizes = self.sizes()
+        return sizes[self._ids[start:stop]] >= target
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+        self._ids = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
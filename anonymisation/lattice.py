@@ -0,0 +1,162 @@
+# automatic choice of generalisation levels (Incognito/Flash-style lattice
+# search): every quasi-identifier has a hierarchy of levels, from the raw value
+# (level 0) to fully suppressed ('*'), and the search finds the combination of
+# levels with the least information loss that is k-anonymous after removing at
+# most `max_suppression` of the rows
+#
+# the data is reduced once to its equivalence classes at level 0 (distinct
+# combinations + counts); every node of the lattice is then evaluated on that
+# table by array indexing, so the cost of a node does not depend on the rows
+from collections import namedtuple
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+from anonymisation.continent import to_continent
+from anonymisation.postcode import map_areas, outward_area
+
+
+# node: level of each quasi-identifier
+# loss: precision loss (mean of level / top level over the quasi-identifiers)
+# suppressed: rows in classes smaller than k at this node
+# evaluated: number of nodes whose classes were actually counted
+Generalisation = namedtuple('Generalisation', ['node', 'loss', 'k', 'suppressed', 'evaluated'])
+
+
+############### hierarchies ###############
+# a hierarchy is a list of functions, one per level above 0, each taking the
+# distinct raw values (a Series) and returning their generalised values
+
+def suppress_all(values):
+    return pd.Series('*', index=values.index)
+
+
+def gender_hierarchy():
+    return [suppress_all]
+
+
+def country_hierarchy():
+    return [lambda v: to_continent(v).astype(object),
+            suppress_all]
+
+
+def postcode_hierarchy(area_to_country):
+    return [lambda v: outward_area(v),
+            lambda v: map_areas(outward_area(v), area_to_country),
+            suppress_all]
+
+
+# 6 levels -> 4 levels (as the government dataset) -> 2 levels
+def education_hierarchy():
+    bands = {'primary': 'school', 'secondary': 'school',
+             'masters': 'postgraduate', 'phD': 'postgraduate', 'bachelor': 'undergraduate'}
+    degree = {'primary': 'no degree', 'secondary': 'no degree', 'other': 'no degree',
+              'masters': 'degree', 'phD': 'degree', 'bachelor': 'degree'}
+    return [lambda v: v.map(lambda x: bands.get(x, x)),
+            lambda v: v.map(lambda x: degree.get(x, x)),
+            suppress_all]
+
+
+# age in years -> 10-year bands -> the quartile bands of CDM_CW2_G2.py
+def age_hierarchy(bins=(-np.inf, 32, 43, 55, np.inf), labels=('18-32', '33-43', '44-55', '55+')):
+    def decade(v):
+        lower = (v // 10 * 10).astype(int)
+        return lower.astype(str) + '-' + (lower + 9).astype(str)
+    return [decade,
+            lambda v: pd.cut(v, list(bins), labels=list(labels)).astype(object),
+            suppress_all]
+
+
+############### search ###############
+
+# codes of every level for one quasi-identifier: level_codes[l][raw_code]
+def _level_codes(raw_values, hierarchy):
+    levels = [np.arange(len(raw_values))]
+    cardinality = [len(raw_values)]
+    values = pd.Series(raw_values)
+    for f in hierarchy:
+        codes, uniques = pd.factorize(f(values).to_numpy(dtype=object), use_na_sentinel=False)
+        levels.append(codes)
+        cardinality.append(max(len(uniques), 1))
+    return levels, cardinality
+
+
+class Lattice:
+
+    def __init__(self, df, hierarchies):
+        self.qi = list(hierarchies)
+        self.hierarchies = hierarchies
+        self.n = len(df)
+        raw = []
+        self.levels, self.cardinality = [], []
+        for c in self.qi:
+            codes, uniques = pd.factorize(df[c], use_na_sentinel=False)
+            raw.append(codes)
+            levels, cardinality = _level_codes(uniques, hierarchies[c])
+            self.levels.append(levels)
+            self.cardinality.append(cardinality)
+        self.top = tuple(len(l) - 1 for l in self.levels)
+        # equivalence classes at the bottom of the lattice, computed once
+        classes, self.counts = np.unique(np.stack(raw, axis=1), axis=0, return_counts=True)
+        self.classes = classes.reshape(-1, len(self.qi))
+        self._cache = {}
+
+    # number of rows in classes smaller than k, and the smallest class kept
+    def evaluate(self, node, k):
+        if (node, k) not in self._cache:
+            keys = np.zeros(len(self.counts), dtype='int64')
+            for i, level in enumerate(node):
+                keys = keys * self.cardinality[i][level] + self.levels[i][level][self.classes[:, i]]
+            _, inverse = np.unique(keys, return_inverse=True)
+            sizes = np.bincount(inverse, weights=self.counts).astype('int64')
+            small = sizes < k
+            suppressed = int(sizes[small].sum())
+            kept = int(sizes[~small].min()) if (~small).any() else 0
+            self._cache[(node, k)] = (suppressed, kept)
+        return self._cache[(node, k)]
+
+    def loss(self, node):
+        return float(np.mean([l / t if t else 0.0 for l, t in zip(node, self.top)]))
+
+    # all nodes, lowest total generalisation first
+    def nodes(self):
+        return sorted(product(*[range(t + 1) for t in self.top]), key=sum)
+
+    # least-loss node meeting k with at most max_suppression of the rows removed
+    # (a fraction if < 1, else a number of rows)
+    def search(self, k=2, max_suppression=0.0):
+        budget = max_suppression * self.n if max_suppression < 1 else max_suppression
+        passed = set()
+        evaluated = 0
+        best = None
+        for node in self.nodes():
+            parents = [node[:i] + (node[i] - 1,) + node[i + 1:] for i in range(len(node)) if node[i] > 0]
+            # monotonicity: a generalisation of a passing node passes too, and
+            # cannot have lower loss, so it is not a candidate
+            if any(p in passed for p in parents):
+                passed.add(node)
+                continue
+            evaluated += 1
+            suppressed, kept = self.evaluate(node, k)
+            if suppressed > budget:
+                continue
+            passed.add(node)
+            loss = self.loss(node)
+            if best is None or (loss, suppressed) < (best.loss, best.suppressed):
+                best = Generalisation(dict(zip(self.qi, node)), loss, kept, suppressed, evaluated)
+        if best is not None:
+            best = best._replace(evaluated=evaluated)
+        return best
+
+    # `df` with the quasi-identifiers generalised to `node` (dict of levels)
+    def apply(self, df, node):
+        out = df.copy()
+        for c in self.qi:
+            level = node[c]
+            if level == 0:
+                continue
+            codes, uniques = pd.factorize(df[c], use_na_sentinel=False)
+            values = self.hierarchies[c][level - 1](pd.Series(uniques)).to_numpy(dtype=object)
+            out[c] = values[codes]
+        return out
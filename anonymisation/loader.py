@@ -0,0 +1,45 @@
+# reading customer_information.csv with the low-cardinality columns as pandas
+# categoricals, so recoding a column is a rename of its categories instead of
+# a replace over every row
+import numpy as np
+import pandas as pd
+
+from anonymisation.storage import read_table, read_table_chunks
+
+
+# explicit dtype map for the extract
+DTYPES = {'gender': 'category',
+          'blood_group': 'category',
+          'education_level': 'category',
+          'country_of_birth': 'category',
+          'current_country': 'category',
+          'cc_status': 'category',
+          'postcode': 'category',
+          'weight': 'float64',
+          'height': 'float64',
+          'avg_n_drinks_per_week': 'float64',
+          'avg_n_cigret_per_week': 'float64',
+          'n_countries_visited': 'int64'}
+
+
+# read the extract (or an iterator of chunks if chunksize is given), from CSV,
+# Parquet or Arrow; with usecols only those columns are read from disk
+def read_customers(path, usecols=None, chunksize=None):
+    dtype = DTYPES if usecols is None else {c: t for c, t in DTYPES.items() if c in usecols}
+    if chunksize is None:
+        return read_table(path, columns=usecols, dtype=dtype)
+    return read_table_chunks(path, chunksize, columns=usecols, dtype=dtype)
+
+
+# Series.replace(mapping) for a categorical column: the mapping is applied to the
+# categories, and categories mapped to the same value are merged by recoding
+# the integer codes; values missing from the mapping are kept
+def recode(s, mapping):
+    if not isinstance(s.dtype, pd.CategoricalDtype):
+        s = s.astype('category')
+    new = pd.Index([mapping.get(c, c) for c in s.cat.categories])
+    if new.is_unique:
+        return s.cat.rename_categories(new)
+    codes, uniques = pd.factorize(new)
+    codes = np.append(codes, -1)[s.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codes, uniques), index=s.index, name=s.name)
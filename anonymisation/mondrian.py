@@ -0,0 +1,120 @@
+# Mondrian multidimensional partitioning for the researchers dataset: instead of
+# fixed quartile bands for age, the numeric and ordinal quasi-identifiers are
+# split recursively at their medians while every part keeps at least k rows,
+# and each row is released with the ranges of its final partition; gender is
+# one of the split dimensions (a part holding both is released as 'F-M'), as
+# releasing it as it is would leave the output 1-anonymous on gender + ranges
+#
+# partitions are NumPy index arrays into one float matrix of the
+# quasi-identifiers (no DataFrame copies); each level of the recursion touches
+# every row once, so the whole run is O(n log n)
+import numpy as np
+import pandas as pd
+
+
+# order used to treat education_level as an ordinal quasi-identifier
+EDUCATION_ORDER = ['other', 'primary', 'secondary', 'bachelor', 'masters', 'phD']
+
+# order of the raw gender values (coded 0/1 columns are used as they are)
+GENDER_ORDER = ['F', 'M']
+
+QI = ['gender', 'age', 'weight', 'height', 'education_level']
+
+
+# quasi-identifiers as one float matrix, ordinal columns as their rank
+def qi_matrix(df, qi, ordinal=None):
+    ordinal = ordinal or {}
+    cols = []
+    for c in qi:
+        if c in ordinal:
+            rank = {v: i for i, v in enumerate(ordinal[c])}
+            cols.append(df[c].map(rank).to_numpy(dtype='float64'))
+        else:
+            cols.append(df[c].to_numpy(dtype='float64'))
+    return np.column_stack(cols)
+
+
+# split idx on dimension d at the median; returns None if either side would
+# hold fewer than k rows
+def _split(xi, idx, d, k):
+    v = xi[:, d]
+    median = np.median(v)
+    left = v <= median
+    if left.sum() < k or (~left).sum() < k:
+        # many rows equal to the median: try putting them on the right
+        left = v < median
+        if left.sum() < k or (~left).sum() < k:
+            return None
+    return idx[left], idx[~left]
+
+
+# partition id of every row, with at least k rows per partition
+def partition(x, k):
+    n = len(x)
+    if n < k:
+        raise ValueError('fewer than k rows')
+    part = np.empty(n, dtype='int64')
+    span = x.max(axis=0) - x.min(axis=0)
+    span[span == 0] = 1
+    stack = [np.arange(n)]
+    n_parts = 0
+    while stack:
+        idx = stack.pop()
+        if len(idx) >= 2 * k:
+            # widest dimension first, relative to the range in the whole data
+            xi = x[idx]
+            width = (xi.max(axis=0) - xi.min(axis=0)) / span
+            for d in np.argsort(-width):
+                if width[d] == 0:
+                    break
+                halves = _split(xi, idx, d, k)
+                if halves is not None:
+                    stack.extend(halves)
+                    break
+            else:
+                halves = None
+            if halves is not None:
+                continue
+        part[idx] = n_parts
+        n_parts += 1
+    return part
+
+
+# min and max of every quasi-identifier in every partition
+def partition_ranges(x, part):
+    order = np.argsort(part, kind='stable')
+    starts = np.searchsorted(part[order], np.arange(part.max() + 1))
+    xs = x[order]
+    return np.minimum.reduceat(xs, starts, axis=0), np.maximum.reduceat(xs, starts, axis=0)
+
+
+# range label of every row for each quasi-identifier ('a-b', or 'a' if a == b)
+def range_labels(lo, hi, part, names=None, decimals=2):
+    if names is not None:
+        lo = [names[int(i)] for i in lo]
+        hi = [names[int(i)] for i in hi]
+    else:
+        lo = np.round(lo, decimals).astype(str)
+        hi = np.round(hi, decimals).astype(str)
+        lo = [s[:-2] if s.endswith('.0') else s for s in lo]
+        hi = [s[:-2] if s.endswith('.0') else s for s in hi]
+    labels = np.array([a if a == b else a + '-' + b for a, b in zip(lo, hi)], dtype=object)
+    return labels[part]
+
+
+# researchers-style dataset with the quasi-identifiers replaced by the ranges
+# of their Mondrian partition; a gender column left out of qi is an error
+def mondrian_bands(df, k, qi=QI, ordinal=None):
+    if 'gender' in df.columns and 'gender' not in qi:
+        raise ValueError('gender would be released unpartitioned: add it to qi or drop the column')
+    if ordinal is None:
+        ordinal = {'education_level': EDUCATION_ORDER} if 'education_level' in qi else {}
+        if 'gender' in qi and not pd.api.types.is_numeric_dtype(df['gender']):
+            ordinal['gender'] = GENDER_ORDER
+    x = qi_matrix(df, qi, ordinal)
+    part = partition(x, k)
+    lo, hi = partition_ranges(x, part)
+    out = df.copy()
+    for d, c in enumerate(qi):
+        out[c] = range_labels(lo[:, d], hi[:, d], part, ordinal.get(c))
+    return out, part
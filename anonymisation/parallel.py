@@ -0,0 +1,233 @@
+# per-column transforms of CDM_CW2_G2.py run in a process pool: the input
+# columns are placed in shared memory once (low-cardinality strings as integer
+# codes, near-unique ones such as postcodes and birthdates as Arrow offsets and
+# bytes), every task is sent the specs of its own inputs only, attaches to
+# them, runs its pipeline and hands its output columns back through new
+# shared-memory blocks
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from anonymisation import streaming
+from anonymisation.stats import RunningStats, standardise
+
+
+# inputs: columns the pipeline reads
+# func: takes a DataFrame of the inputs, returns a DataFrame of outputs
+#       (anything it puts in .attrs is returned to the caller as well)
+ColumnTask = namedtuple('ColumnTask', ['inputs', 'func'])
+
+
+############### shared memory ###############
+
+# copy an array into a new shared-memory block; returns (block, spec)
+def _to_shared(values):
+    values = np.ascontiguousarray(values)
+    shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+    np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf)[:] = values
+    return shm, (shm.name, values.dtype.str, values.shape)
+
+
+def _from_shared(spec):
+    name, dtype, shape = spec
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+# columns with more distinct values than this share of their first rows are
+# shared as strings, not factorised in the parent
+NEAR_UNIQUE = 0.5
+SAMPLE_ROWS = 10000
+
+
+def _near_unique(s):
+    head = s.iloc[:SAMPLE_ROWS]
+    return len(head) > 0 and len(pd.unique(head)) > NEAR_UNIQUE * len(head)
+
+
+# string column as Arrow large_string buffers: validity bitmap (or None),
+# offsets and UTF-8 bytes, or None if the values are not all strings
+def _string_buffers(s):
+    import pyarrow as pa
+    try:
+        arr = pa.array(s, type=pa.large_string())
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return None
+    if isinstance(arr, pa.ChunkedArray):
+        arr = arr.combine_chunks()
+    _, offsets, data = arr.buffers()
+    offsets = np.frombuffer(offsets, np.int64)[arr.offset:arr.offset + len(arr) + 1]
+    data = np.frombuffer(data, np.uint8)[offsets[0]:offsets[-1]] if data is not None else np.zeros(0, np.uint8)
+    valid = None
+    if arr.null_count:
+        valid = np.packbits(arr.is_valid().to_numpy(zero_copy_only=False), bitorder='little')
+    return valid, offsets - offsets[0], data
+
+
+def _strings(arrays):
+    import pyarrow as pa
+    valid, offsets, data = arrays
+    buffers = [None if valid is None else pa.py_buffer(valid), pa.py_buffer(offsets), pa.py_buffer(data)]
+    return pa.Array.from_buffers(pa.large_string(), len(offsets) - 1, buffers).to_pandas()
+
+
+# put every column of df in shared memory: numeric columns as they are,
+# near-unique strings as Arrow buffers, all others as categorical codes +
+# categories (the categories are pickled, small); spec: (kind, block specs,
+# categories)
+def share_columns(df):
+    blocks, specs = [], {}
+
+    def share(values):
+        if values is None:
+            return None
+        shm, spec = _to_shared(values)
+        blocks.append(shm)
+        return spec
+
+    for c in df.columns:
+        s = df[c]
+        if pd.api.types.is_numeric_dtype(s.dtype) and not isinstance(s.dtype, pd.CategoricalDtype):
+            specs[c] = ('values', [share(s.to_numpy())], None)
+            continue
+        buffers = None
+        if not isinstance(s.dtype, pd.CategoricalDtype) and _near_unique(s):
+            buffers = _string_buffers(s)
+        if buffers is not None:
+            specs[c] = ('strings', [share(b) for b in buffers], None)
+        else:
+            s = s.astype('category')
+            specs[c] = ('category', [share(s.cat.codes.to_numpy())], list(s.cat.categories))
+    return blocks, specs
+
+
+# rebuild columns from their specs; arrays are copied out so the blocks can close
+def _read_columns(specs, index=None):
+    out = {}
+    for c, (kind, block_specs, categories) in specs.items():
+        arrays = []
+        for spec in block_specs:
+            if spec is None:
+                arrays.append(None)
+                continue
+            shm, values = _from_shared(spec)
+            arrays.append(values.copy())
+            shm.close()
+        if kind == 'values':
+            out[c] = arrays[0]
+        elif kind == 'category':
+            out[c] = pd.Categorical.from_codes(arrays[0], categories)
+        else:
+            out[c] = _strings(arrays).array
+    return pd.DataFrame(out, index=index)
+
+
+def _release(blocks):
+    for shm in blocks:
+        shm.close()
+        shm.unlink()
+
+
+############### workers ###############
+
+def _run_task(task, specs):
+    frame = _read_columns(specs)
+    out = task.func(frame)
+    blocks, out_specs = share_columns(out)
+    # the parent unlinks the blocks after reading them
+    for shm in blocks:
+        shm.close()
+    return out_specs, dict(out.attrs)
+
+
+# run every task in a process pool; returns the output columns of all tasks in
+# one DataFrame (in task order) and the .attrs of each task's output
+def run_parallel(df, tasks, processes=None):
+    blocks, specs = share_columns(df[sorted({c for t in tasks.values() for c in t.inputs})])
+    try:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            # each task is pickled with the specs of its own inputs only
+            futures = {name: pool.submit(_run_task, task, {c: specs[c] for c in task.inputs})
+                       for name, task in tasks.items()}
+            results = {name: f.result() for name, f in futures.items()}
+    finally:
+        _release(blocks)
+    frames, attrs = [], {}
+    for name, (out_specs, out_attrs) in results.items():
+        frames.append(_read_columns(out_specs, index=df.index))
+        for _, block_specs, _ in out_specs.values():
+            for spec in block_specs:
+                if spec is not None:
+                    shm = shared_memory.SharedMemory(name=spec[0])
+                    shm.close()
+                    shm.unlink()
+        attrs[name] = out_attrs
+    return pd.concat(frames, axis=1), attrs
+
+
+############### column pipelines of CDM_CW2_G2.py ###############
+
+def _standardise_column(column, frame):
+    stats = RunningStats([column]).update(frame)
+    info = stats.info()
+    out = standardise(frame[[column]].copy(), info)
+    out.attrs['stats'] = info[column]
+    return out
+
+
+def _gender(frame):
+    return streaming.code_gender(frame)
+
+
+def _age(frame):
+    return streaming.derive_age(frame)
+
+
+def _blood_group(frame):
+    return streaming.code_blood_group(frame)
+
+
+def _education_res(frame):
+    return streaming.code_education(frame.copy())
+
+
+def _education_gov(frame):
+    return streaming.band_education_gov(frame.copy()).rename(columns={'education_level': 'education_level_gov'})
+
+
+def _continent(frame):
+    return streaming.continent_of_birth(frame)
+
+
+def _postcode(frame, area_to_country):
+    return streaming.band_postcode(frame, area_to_country)
+
+
+def cdm_tasks(area_to_country):
+    tasks = {'gender': ColumnTask(['gender'], _gender),
+             'age': ColumnTask(['birthdate'], _age),
+             'blood_group': ColumnTask(['blood_group'], _blood_group),
+             'education_level': ColumnTask(['education_level'], _education_res),
+             'education_level_gov': ColumnTask(['education_level'], _education_gov),
+             'continent_of_birth': ColumnTask(['country_of_birth'], _continent),
+             'UK_region': ColumnTask(['postcode'], partial(_postcode, area_to_country=area_to_country))}
+    for c in streaming.STD_COLUMNS:
+        tasks[c] = ColumnTask([c], partial(_standardise_column, c))
+    return tasks
+
+
+# researchers and government datasets (before suppression) and the mean/sd
+# info for coding.json, from a frame that already has sid
+def anonymise_parallel(df, processes=None):
+    out, attrs = run_parallel(df, cdm_tasks(streaming.load_area_to_country()), processes)
+    out['sid'] = df['sid'].to_numpy()
+    out['cc_status'] = df['cc_status'].to_numpy()
+    df_res = out[streaming.RES_COLUMNS]
+    df_gov = out[['sid', 'continent_of_birth', 'UK_region', 'cc_status', 'education_level_gov']]
+    df_gov = df_gov.rename(columns={'education_level_gov': 'education_level'})
+    info = {c: attrs[c]['stats'] for c in streaming.STD_COLUMNS}
+    return df_res, df_gov, info
@@ -0,0 +1,383 @@
+# all release datasets from one scan of the extract: each profile (researchers,
+# government, direct identifiers, ...) is declared as output column -> source
+# column, where a source is either a raw column or a derived one (age band,
+# continent, postcode area, Z-score, ...); every chunk is read once, each
+# derived column is computed at most once per chunk and shared by all profiles
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from anonymisation import streaming
+from anonymisation.continent import V2_OVERRIDES, continent_table, to_continent
+from anonymisation.dates import ages, band
+from anonymisation.kanon import ClassCounter
+from anonymisation.loader import recode
+from anonymisation.postcode import map_areas, outward_area
+from anonymisation.profiling import Profiler, stage
+from anonymisation.pseudonym import column_key, domain, pseudonymise
+from anonymisation.sid import sid_key
+from anonymisation.stats import RunningStats
+from anonymisation.storage import TableWriter, dictionary_path, read_table_chunks, with_format
+from anonymisation.surrogate import keyed_postcodes
+
+
+# columns: output column -> source column (raw or derived)
+# file: output file name (the extension follows the chosen format)
+# qi, k: rows whose quasi-identifier combination occurs fewer than k times are
+#        removed in a second pass over the written rows
+# coding: function of the run context returning the coding dictionary saved
+#         next to the output, or None
+# categories: output column -> list of its values (or function of the run
+#             context returning it), used for the integer-coded output
+# coding_file: name of the coding dictionary file
+Profile = namedtuple('Profile', ['columns', 'file', 'qi', 'k', 'coding', 'categories', 'coding_file'],
+                     defaults=[None, None, None, None, 'coding.json'])
+
+
+############### derived columns ###############
+# name -> (source columns, function of the chunk's columns and the run context)
+
+def _std(column, source=None):
+    source = column if source is None else source
+    def f(cols):
+        info = cols.ctx['stats'][column]
+        return (cols[source] - info['mean']) / info['sd']
+    return ([source], f)
+
+
+# countries and continents that can get a keyed code (see pseudonym.py)
+def country_domain():
+    return domain('country_of_birth')
+
+
+def continent_domain():
+    return domain('continent_of_birth')
+
+
+DERIVED = {
+    'gender_code': (['gender'], lambda cols: pd.Series(np.where(cols['gender'] == 'M', 1, 0), index=cols.index)),
+    'age_years': (['birthdate'], lambda cols: ages(cols['birthdate'], cols.ctx['reference'])),
+    'age_band': (['age_years'], lambda cols: pd.Series(band(cols['age_years'], cols.ctx['age_bins'],
+                                                            streaming.age_labels(cols.ctx['age_bins'])),
+                                                       index=cols.index)),
+    'blood_group_code': (['blood_group'], lambda cols: recode(cols['blood_group'], streaming.BG_CODE)),
+    'education_res': (['education_level'], lambda cols: recode(recode(cols['education_level'], streaming.EL_RES_BANDS), streaming.EL_CODE)),
+    'education_gov': (['education_level'], lambda cols: recode(cols['education_level'], streaming.EL_GOV_BANDS)),
+    'continent_of_birth': (['country_of_birth'], lambda cols: to_continent(cols['country_of_birth'])),
+    'postcode_area': (['postcode'], lambda cols: outward_area(cols['postcode'])),
+    'UK_region': (['postcode_area'], lambda cols: map_areas(cols['postcode_area'], cols.ctx['area_to_country'])),
+    # Researchers_v2.py: numeric codes, keyed codes for places, surrogate postcodes
+    'blood_group_number': (['blood_group'], lambda cols: recode(cols['blood_group'], streaming.BG_NUMBER)),
+    'education_number': (['education_level'], lambda cols: recode(cols['education_level'], streaming.EL_NUMBER)),
+    'country_code': (['country_of_birth'], lambda cols: pseudonymise(cols['country_of_birth'], cols.ctx['key'], 100, 1000,
+                                                                     domain=country_domain())[0]),
+    'continent_v2': (['country_of_birth'], lambda cols: to_continent(cols['country_of_birth'], V2_OVERRIDES)),
+    'continent_code': (['continent_v2'], lambda cols: pseudonymise(cols['continent_v2'], cols.ctx['key'], 10, 100,
+                                                                   domain=continent_domain(), name='continent_of_birth')[0]),
+    'postcode_surrogate': (['postcode_area'], lambda cols: keyed_postcodes(cols['postcode_area'],
+                                                                           column_key(cols.ctx['key'], 'postcode'),
+                                                                           sorted(cols.ctx['area_to_country']))),
+    # Researchers_v3.py: numeric codes of the education bands
+    'education_res_number': (['education_level'], lambda cols: recode(recode(cols['education_level'], streaming.EL_RES_BANDS),
+                                                                      streaming.EL_RES_NUMBER)),
+    'age_std': _std('age', 'age_years'),
+}
+for c in streaming.STD_COLUMNS:
+    DERIVED[c + '_std'] = _std(c)
+
+
+# columns whose mean/sd a set of sources needs (age is derived from birthdate)
+def stats_columns(sources):
+    return [c for c in streaming.STD_COLUMNS + ['age'] if c + '_std' in sources]
+
+
+# the raw columns to read for the stats, and a chunk with age added
+def stats_source(columns):
+    return sorted(set(columns) - {'age'} | ({'birthdate'} if 'age' in columns else set()))
+
+
+def with_age(chunk, reference):
+    if 'birthdate' in chunk:
+        chunk['age'] = ages(chunk['birthdate'], reference)
+    return chunk
+
+
+# raw columns a set of sources needs
+def raw_columns(sources):
+    raw = set()
+    for s in sources:
+        if s in DERIVED:
+            raw |= raw_columns(DERIVED[s][0])
+        elif s != 'sid':
+            raw.add(s)
+    return raw
+
+
+# columns of one chunk, derived ones computed on first access
+class ChunkColumns:
+
+    def __init__(self, chunk, ctx):
+        self.chunk = chunk
+        self.index = chunk.index
+        self.ctx = ctx
+        self._cache = {}
+
+    def __getitem__(self, name):
+        if name not in self._cache:
+            if name in DERIVED:
+                # sources first, so each derived column is timed on its own
+                for source in DERIVED[name][0]:
+                    self[source]
+                with stage(self.ctx.get('profiler'), 'derive ' + name, len(self.index)):
+                    self._cache[name] = DERIVED[name][1](self)
+            else:
+                self._cache[name] = self.chunk[name]
+        return self._cache[name]
+
+    def frame(self, columns):
+        return pd.DataFrame({out: self[src] for out, src in columns.items()}, index=self.index)
+
+
+############### profiles ###############
+
+def researchers_coding(ctx):
+    imp_info = {'gender': streaming.GENDER_CODE,
+                'blood_group': streaming.BG_CODE,
+                'education_level': streaming.EL_CODE}
+    imp_info.update({c: v for c, v in ctx['stats'].items() if c in streaming.STD_COLUMNS})
+    return imp_info
+
+
+# the codes of every country and continent are those the keyed pseudonyms give
+def researchers_v2_coding(ctx):
+    imp_info = {'gender': streaming.GENDER_CODE,
+                'blood_group': streaming.BG_NUMBER,
+                'education_level': streaming.EL_NUMBER,
+                'country_of_birth': pseudonymise(pd.Series(country_domain(), name='country_of_birth'), ctx['key'],
+                                                 100, 1000, domain=country_domain())[1],
+                'continent_of_birth': pseudonymise(pd.Series(continent_domain(), name='continent_of_birth'), ctx['key'],
+                                                   10, 100, domain=continent_domain())[1]}
+    imp_info.update(ctx['stats'])
+    return imp_info
+
+
+# Researchers_v3.py: numeric codes, plain column names, an instructions block
+def researchers_v3_coding(ctx):
+    imp_info = {'instructions': {'Categorical variables': 'Coding information can be found in this file',
+                                 'Continuous variables': 'Standardised: Mean and standard deviations can be found '
+                                                         'in this file to reverse to original values'},
+                'gender': streaming.GENDER_CODE,
+                'education_level': streaming.EL_RES_NUMBER,
+                'blood_group': streaming.BG_NUMBER}
+    imp_info.update({c: v for c, v in ctx['stats'].items() if c in streaming.STD_COLUMNS})
+    return imp_info
+
+
+PROFILES = {
+    'researchers': Profile({'sid': 'sid', 'gender': 'gender_code', 'age': 'age_band', 'cc_status': 'cc_status',
+                            'weight_std': 'weight_std', 'height_std': 'height_std',
+                            'blood_group': 'blood_group_code',
+                            'avg_n_drinks_per_week_std': 'avg_n_drinks_per_week_std',
+                            'avg_n_cigret_per_week_std': 'avg_n_cigret_per_week_std',
+                            'n_countries_visited_std': 'n_countries_visited_std',
+                            'education_level': 'education_res'},
+                           'researchers_dataset', coding=researchers_coding,
+                           categories={'gender': [0, 1],
+                                       'age': lambda ctx: streaming.age_labels(ctx['age_bins']),
+                                       'cc_status': ['0', '1'],
+                                       'blood_group': sorted(streaming.BG_CODE.values()),
+                                       'education_level': sorted(streaming.EL_CODE.values())}),
+    'government': Profile({'sid': 'sid', 'continent_of_birth': 'continent_of_birth', 'UK_region': 'UK_region',
+                           'cc_status': 'cc_status', 'education_level': 'education_gov'},
+                          'gov_dataset', qi=streaming.GOV_QI, k=2,
+                          categories={'continent_of_birth': lambda ctx: sorted(set(continent_table().values())),
+                                      'UK_region': lambda ctx: sorted(set(ctx['area_to_country'].values())),
+                                      'cc_status': ['0', '1'],
+                                      'education_level': sorted(set(streaming.EL_GOV_BANDS.values()) | {'other'})}),
+    'researchers_v3': Profile({'sid': 'sid', 'gender': 'gender_code', 'age': 'age_band',
+                               'education_level': 'education_res_number', 'cc_status': 'cc_status',
+                               'weight': 'weight_std', 'height': 'height_std', 'blood_group': 'blood_group_number',
+                               'avg_n_drinks_per_week': 'avg_n_drinks_per_week_std',
+                               'avg_n_cigret_per_week': 'avg_n_cigret_per_week_std',
+                               'n_countries_visited': 'n_countries_visited_std'},
+                              'researchers_dataset', coding=researchers_v3_coding,
+                              categories={'gender': [0, 1],
+                                          'age': lambda ctx: streaming.age_labels(ctx['age_bins']),
+                                          'education_level': sorted(streaming.EL_RES_NUMBER.values()),
+                                          'cc_status': ['0', '1'],
+                                          'blood_group': sorted(streaming.BG_NUMBER.values())}),
+    'researchers_v2': Profile({'sid': 'sid', 'cc_status': 'cc_status', 'postcode': 'postcode_surrogate',
+                               'country_of_birth': 'country_code', 'continent_of_birth': 'continent_code',
+                               'age': 'age_std', 'education_level': 'education_number', 'weight': 'weight_std',
+                               'height': 'height_std', 'blood_group': 'blood_group_number', 'gender': 'gender_code',
+                               'avg_n_drinks_per_week': 'avg_n_drinks_per_week_std',
+                               'avg_n_cigret_per_week': 'avg_n_cigret_per_week_std',
+                               'n_countries_visited': 'n_countries_visited_std'},
+                              'researchers_v2_dataset', coding=researchers_v2_coding,
+                              categories={'cc_status': ['0', '1'],
+                                          'education_level': sorted(streaming.EL_NUMBER.values()),
+                                          'blood_group': sorted(streaming.BG_NUMBER.values()),
+                                          'gender': [0, 1]},
+                              coding_file='res_data_coding.json'),
+    'direct_identifiers': Profile({c: c for c in ['sid'] + streaming.DIRECT_IDENTIFIERS}, 'direct_identifiers'),
+}
+
+
+############### runner ###############
+
+# what the derived columns need besides the chunk: reference data, the secret
+# key of the keyed codes, age reference and bands ('stats' is added once known)
+def run_context(key, profiler=None, reference=streaming.AGE_YEAR, age_bins=streaming.AGE_BINS):
+    return {'area_to_country': streaming.load_area_to_country(), 'profiler': profiler, 'key': key,
+            'reference': reference, 'age_bins': age_bins}
+
+
+def _remove(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+# the profiles in `names`; profiles writing the same files (researchers and
+# researchers_v3) cannot be run together
+def select_profiles(names):
+    profiles = {name: PROFILES[name] for name in names}
+    for attr in ('file', 'coding_file'):
+        taken = {}
+        for name, p in profiles.items():
+            if attr == 'coding_file' and p.coding is None:
+                continue
+            other = taken.setdefault(getattr(p, attr), name)
+            if other != name:
+                raise ValueError('profiles %s and %s both write %s' % (other, name, getattr(p, attr)))
+    return profiles
+
+
+# dictionaries of the coded columns of a profile
+def profile_dictionary(profile, ctx):
+    return {c: v(ctx) if callable(v) else list(v) for c, v in (profile.categories or {}).items()}
+
+
+# write every profile in `names` to out_dir from one scan of the extract (plus a
+# first scan of the standardised columns only, if a profile needs Z-scores);
+# with coded=True the columns in each profile's categories are written as
+# integer codes (see storage.py); returns the number of rows read and the rows
+# removed per profile; with a Profiler every stage is measured (see profiling.py);
+# ages are taken at `reference` (a year, or a date for exact ages) and banded
+# with `age_bins` ('quartiles' computes the edges from the extract first)
+def run(names, out_dir, path=streaming.PATH, fmt='csv', chunksize=streaming.CHUNKSIZE, key=None, coded=False,
+        profiler=None, reference=streaming.AGE_YEAR, age_bins=streaming.AGE_BINS):
+    profiles = select_profiles(names)
+    sources = {s for p in profiles.values() for s in p.columns.values()}
+    needed = raw_columns(sources)
+    key = sid_key() if key is None else key
+    with stage(profiler, 'reference data'):
+        ctx = run_context(key, profiler, reference, age_bins)
+    if age_bins == 'quartiles' and 'age_band' in sources:
+        with stage(profiler, 'age quartiles'):
+            ctx['age_bins'] = streaming.age_edges(path, reference, chunksize=chunksize)
+
+    # pass 1: mean/sd of the columns that are standardised
+    std_columns = stats_columns(sources)
+    stats = RunningStats(std_columns)
+    if std_columns:
+        with stage(profiler, 'standardisation stats'):
+            for chunk in streaming.read_chunks(path, chunksize, usecols=stats_source(std_columns)):
+                stats.update(with_age(chunk, reference))
+    ctx['stats'] = stats.info()
+
+    # pass 2: every profile from the same chunks
+    paths, tmp_paths, counters = {}, {}, {}
+    for name, p in profiles.items():
+        paths[name] = with_format(os.path.join(out_dir, p.file + '.csv'), fmt)
+        tmp_paths[name] = paths[name]
+        if p.k:
+            root, ext = os.path.splitext(paths[name])
+            tmp_paths[name] = root + '.tmp' + ext
+            counters[name] = ClassCounter(p.qi, root + '.classes.bin')
+    dictionaries = {name: profile_dictionary(p, ctx) if coded else None for name, p in profiles.items()}
+    # rows are coded as they are first written, so the suppression pass copies
+    # codes and never re-reads values with other dtypes
+    writers = {name: TableWriter(tmp_paths[name], dictionaries[name]) for name, p in profiles.items()}
+    n = 0
+    removed = {}
+    try:
+        try:
+            chunks = iter(streaming.read_chunks(path, chunksize, usecols=sorted(needed)))
+            while True:
+                with stage(profiler, 'read'):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                if profiler is not None:
+                    profiler.add_rows('read', len(chunk))
+                with stage(profiler, 'sid', len(chunk)):
+                    chunk = streaming.assign_sid(chunk, n, key)
+                cols = ChunkColumns(chunk, ctx)
+                for name, p in profiles.items():
+                    out = cols.frame(p.columns)
+                    with stage(profiler, 'write ' + name, len(out)):
+                        writers[name].write(out)
+                    if p.k:
+                        with stage(profiler, 'k-anonymity count ' + name, len(out)):
+                            counters[name].add(out)
+                n += len(chunk)
+        finally:
+            for w in writers.values():
+                w.close()
+
+        # pass 3, only over the profiles with k: copy the rows of classes of at
+        # least k, masked with the class sizes of each row
+        for name, p in profiles.items():
+            if p.coding is not None:
+                with open(os.path.join(out_dir, p.coding_file), 'w') as fp:
+                    json.dump(p.coding(ctx), fp, indent = 4)
+            if not p.k:
+                continue
+            removed[name] = 0
+            start = 0
+            with stage(profiler, 'suppression ' + name, n), \
+                    TableWriter(paths[name], dictionaries[name], encoded=True) as out:
+                for chunk in read_table_chunks(tmp_paths[name], chunksize):
+                    keep = counters[name].keep(start, start + len(chunk), p.k)
+                    start += len(chunk)
+                    removed[name] += int((~keep).sum())
+                    out.write(chunk[keep])
+    except BaseException:
+        # no partial release is left behind
+        for name in profiles:
+            _remove(paths[name], *([dictionary_path(paths[name])] if dictionaries[name] else []))
+        raise
+    finally:
+        for name in counters:
+            counters[name].close()
+            _remove(tmp_paths[name], dictionary_path(tmp_paths[name]))
+    return n, removed
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='release datasets from one scan of customer_information')
+    parser.add_argument('profiles', nargs='+', choices=sorted(PROFILES))
+    parser.add_argument('--out-dir', default='.')
+    parser.add_argument('--input', default=streaming.PATH, help='CSV, Parquet or Arrow extract')
+    parser.add_argument('--format', default='csv', choices=['csv', 'parquet', 'arrow'], help='output format')
+    parser.add_argument('--chunksize', type=int, default=streaming.CHUNKSIZE)
+    parser.add_argument('--coded', action='store_true', help='write coded columns as small integers')
+    parser.add_argument('--profile-report', help='measure every stage and write a JSON report here')
+    parser.add_argument('--reference', default=str(streaming.AGE_YEAR),
+                        help='age reference: a year (year difference) or a YYYY-MM-DD date (exact age)')
+    parser.add_argument('--age-bands', default='fixed', choices=['fixed', 'quartiles'],
+                        help='fixed coursework edges, or quartiles of the extract computed in an extra scan')
+    args = parser.parse_args()
+    reference = int(args.reference) if args.reference.isdigit() else args.reference
+    age_bins = streaming.AGE_BINS if args.age_bands == 'fixed' else 'quartiles'
+    profiler = Profiler() if args.profile_report else None
+    n, removed = run(args.profiles, args.out_dir, args.input, args.format, args.chunksize, coded=args.coded,
+                     profiler=profiler, reference=reference, age_bins=age_bins)
+    if profiler is not None:
+        profiler.write(args.profile_report)
+    print('rows:', n, 'removed:', removed)
@@ -0,0 +1,50 @@
+# postcode banding without a Python loop per row: the outward area (letters
+# before the first digit) is cut out on a byte matrix, and the area -> UK country
+# conversion is one dictionary lookup per distinct area, spread back by code
+import numpy as np
+import pandas as pd
+
+from anonymisation.loader import recode
+
+
+# keep characters before first digit (the whole postcode if it has no digit);
+# for a categorical column only the categories are cut; missing postcodes give
+# missing areas
+def outward_area(postcodes):
+    if isinstance(postcodes.dtype, pd.CategoricalDtype):
+        # full postcodes are nearly unique, so the codes are remapped directly
+        # rather than through a category -> area dictionary
+        areas = outward_area(pd.Series(postcodes.cat.categories.to_numpy(dtype=object)))
+        area_codes, uniques = pd.factorize(areas)
+        codes = np.append(area_codes, -1)[postcodes.cat.codes.to_numpy()]
+        return pd.Series(pd.Categorical.from_codes(codes, uniques), index=postcodes.index, name=postcodes.name)
+    missing = postcodes.isna().to_numpy()
+    values = np.where(missing, '', postcodes.to_numpy(dtype=object))
+    try:
+        b = values.astype('S')
+    except UnicodeEncodeError:
+        # not plain ASCII, use the regex path
+        return postcodes.str.extract(r'^(\D*)', expand=False)
+    n, width = len(b), b.dtype.itemsize
+    if n == 0 or width == 0:
+        return postcodes.copy()
+    m = b.view(np.uint8).reshape(n, width).copy()
+    digit = (m >= ord('0')) & (m <= ord('9'))
+    first = np.where(digit.any(axis=1), digit.argmax(axis=1), width)
+    # blank out everything from the first digit on; trailing NULs are dropped
+    # when the rows are read back as byte strings
+    m[np.arange(width) >= first[:, None]] = 0
+    codes, uniques = pd.factorize(m.view('S%d' % width).ravel())
+    areas = np.array([u.decode() for u in uniques], dtype=object)[codes]
+    areas[missing] = np.nan
+    return pd.Series(areas, index=postcodes.index, name=postcodes.name)
+
+
+# convert areas with a dictionary, values missing from it are kept as they are
+# (the same behaviour as Series.replace(dict))
+def map_areas(areas, mapping):
+    if isinstance(areas.dtype, pd.CategoricalDtype):
+        return recode(areas, mapping)
+    codes, uniques = pd.factorize(areas)
+    mapped = np.array([mapping.get(u, u) for u in uniques] + [np.nan], dtype=object)
+    return pd.Series(mapped[codes], index=areas.index, name=areas.name)
@@ -0,0 +1,76 @@
+# opt-in instrumentation of the pipeline stages: wall time, CPU time, rows
+# processed and memory delta per stage, accumulated over chunks and written as
+# a JSON report after the run; without a Profiler the stages are not measured
+import json
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+
+# current resident memory of this process in bytes (Linux /proc, else psutil
+# if installed); None if neither is there, the high-water mark from getrusage
+# is no substitute (it never goes down, and it is in bytes on macOS, KiB on Linux)
+def rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+class Profiler:
+
+    def __init__(self):
+        self.stages = {}
+        self.started = time.time()
+
+    # measure the block as (part of) stage `name`; rows is the number of rows it handles
+    @contextmanager
+    def stage(self, name, rows=0):
+        s = self.stages.setdefault(name, {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'rows': 0,
+                                          'mem_delta_mb': 0.0, 'peak_rss_mb': 0.0})
+        mem = rss()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            s['calls'] += 1
+            s['wall_s'] += time.perf_counter() - wall
+            s['cpu_s'] += time.process_time() - cpu
+            s['rows'] += rows
+            after = rss()
+            if mem is None or after is None:
+                # memory not measurable here: reported as null
+                s['mem_delta_mb'] = s['peak_rss_mb'] = None
+            elif s['mem_delta_mb'] is not None:
+                s['mem_delta_mb'] += (after - mem) / 2 ** 20
+                s['peak_rss_mb'] = max(s['peak_rss_mb'], after / 2 ** 20)
+
+    # rows only known once the stage has run (e.g. the size of a chunk just read)
+    def add_rows(self, name, rows):
+        self.stages[name]['rows'] += rows
+
+    def report(self):
+        total = sum(s['wall_s'] for s in self.stages.values())
+        stages = {}
+        for name, s in self.stages.items():
+            stages[name] = dict(s)
+            stages[name]['rows_per_s'] = s['rows'] / s['wall_s'] if s['rows'] and s['wall_s'] else None
+            stages[name]['share'] = s['wall_s'] / total if total else None
+        return {'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+                'wall_s': time.time() - self.started,
+                'stages': stages}
+
+    def write(self, path):
+        with open(path, 'w') as fp:
+            json.dump(self.report(), fp, indent = 4)
+
+
+# profiler.stage(...) if profiling is on, else a no-op context
+def stage(profiler, name, rows=0):
+    return profiler.stage(name, rows) if profiler is not None else nullcontext()
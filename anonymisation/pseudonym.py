@@ -0,0 +1,77 @@
+# keyed codes for categorical values (country, continent, ...) computed from
+# the value itself, so every worker and every incremental run gives a value the
+# same code with no shared dictionary; the work is one keyed hash (or one
+# domain lookup) per distinct value, spread back to the rows by categorical code
+#
+# with a domain (the list of every possible value, e.g. the countries of the
+# continent table) a value's code is its position in the domain under a keyed
+# permutation of the code range (sid.permute), so codes never collide; without
+# one the code is a keyed hash of the value cut to the range, and colliding
+# values are reported instead of silently sharing a code
+#
+# the domain lists are part of the key: a value's code depends on its position
+# in the list, so the keyed codes of Researchers_v2.py and of the pipeline (and
+# of every incremental run) agree only because both read the same lists from
+# DOMAIN_PATH; new values are appended at the end, never sorted in, so the codes
+# of the values already there stay the same
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from anonymisation.sid import permute
+
+
+DOMAIN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'CDM_CW2_G2', 'Supporting_material',
+                           'pseudonym_domains.json')
+
+_domains = {}
+
+
+# the fixed domain of a column (country_of_birth, continent_of_birth)
+def domain(name, path=DOMAIN_PATH):
+    if path not in _domains:
+        with open(path) as fp:
+            _domains[path] = json.load(fp)
+    return _domains[path][name]
+
+
+# key for one column, so the same secret gives unrelated codes per column
+def column_key(key, name):
+    return hashlib.blake2b(key, digest_size=32, person=b'pseudonym', salt=name.encode()[:16]).digest()
+
+
+# codes in [low, high) for a list of distinct values
+def keyed_codes(values, key, low, high, domain=None):
+    size = high - low
+    values = list(values)
+    if domain is not None:
+        rank = {v: i for i, v in enumerate(domain)}
+        if len(rank) > size:
+            raise ValueError('domain of %d values does not fit in %d codes' % (len(rank), size))
+        missing = [v for v in values if v not in rank]
+        if missing:
+            raise ValueError('values not in the domain: %s' % missing[:10])
+        return low + permute(np.array([rank[v] for v in values], dtype='int64'), size, key)
+    codes = np.array([int.from_bytes(hashlib.blake2b(str(v).encode(), key=key, digest_size=8).digest(), 'little') % size
+                      for v in values], dtype='int64') + low
+    unique, counts = np.unique(codes, return_counts=True)
+    if (counts > 1).any():
+        clashes = [[v for v, c in zip(values, codes) if c == code] for code in unique[counts > 1]]
+        raise ValueError('values sharing a code (use a wider range or a domain): %s' % clashes[:10])
+    return codes
+
+
+# replace a column's values with their keyed codes; returns the coded column
+# and the value -> code dictionary of the values present
+def pseudonymise(values, key, low, high, domain=None, name=None):
+    key = column_key(key, values.name if name is None else name)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+    else:
+        codes, uniques = pd.factorize(values)
+    mapped = keyed_codes(uniques, key, low, high, domain)
+    column = pd.Series(pd.Categorical.from_codes(codes, mapped), index=values.index, name=values.name)
+    return column, dict(zip(uniques.tolist(), mapped.tolist()))
@@ -0,0 +1,113 @@
+# reference data (postcode area -> UK country, country -> continent with the
+# override lists) compiled once into a single .npz of string and code arrays;
+# later runs load the arrays directly if the checksum of the sources still
+# matches, so no CSV parsing, dict building or pycountry_convert queries at
+# startup, and a lookup is an Index.get_indexer on the distinct values plus
+# array indexing
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from anonymisation import continent
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+POSTCODE_PATH = os.path.join(ROOT, 'CDM_CW2_G2', 'Supporting_material', 'postcode_country.csv')
+CACHE_PATH = os.path.join(ROOT, 'CDM_CW2_G2', 'Supporting_material', '.reference_cache.npz')
+
+
+# sha256 of the source files and the override list
+def checksum(postcode_path=POSTCODE_PATH, table_path=continent.TABLE_PATH):
+    h = hashlib.sha256()
+    for path in (postcode_path, table_path):
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    h.update(repr(sorted(continent.OVERRIDES.items())).encode())
+    return h.hexdigest()
+
+
+class ReferenceData:
+
+    def __init__(self, arrays):
+        self.areas = pd.Index(arrays['areas'])
+        self.regions = arrays['regions'].astype(object)
+        self.area_region = arrays['area_region']
+        self.countries = pd.Index(arrays['countries'])
+        self.continents = arrays['continents'].astype(object)
+        self.country_continent = arrays['country_continent']
+
+    # postcode area -> UK country (Channel Islands, Isle of Man as they are)
+    def area_to_country(self):
+        return dict(zip(self.areas, self.regions[self.area_region]))
+
+    # country -> continent, as continent.continent_table()
+    def continent_table(self):
+        return dict(zip(self.countries, self.continents[self.country_continent]))
+
+    # look up the distinct values of a column: the result for every value,
+    # None where the value is not in the table
+    def lookup(self, values, kind):
+        index, labels, codes = {'area': (self.areas, self.regions, self.area_region),
+                                'country': (self.countries, self.continents, self.country_continent)}[kind]
+        position = index.get_indexer(pd.Index(values))
+        found = position >= 0
+        out = np.full(len(position), None, dtype=object)
+        out[found] = labels[codes[position[found]]]
+        return out
+
+
+def _codes(values):
+    codes, labels = pd.factorize(np.asarray(values, dtype=object))
+    return codes.astype('int16'), labels.astype(str)
+
+
+# compile the arrays from the CSV sources (the continent table is built from
+# pycountry_convert first if it is not on disk)
+def build(postcode_path=POSTCODE_PATH, table_path=continent.TABLE_PATH):
+    postcode_country = pd.read_csv(postcode_path)
+    area_region, regions = _codes(postcode_country['Country'])
+    if os.path.exists(table_path):
+        table = continent.read_table(table_path)
+    else:
+        table = continent.build_table()
+        continent.save_table(table, table_path)
+    countries = sorted(table)
+    country_continent, continents = _codes([table[c] for c in countries])
+    return {'areas': postcode_country['Postcode area'].to_numpy(dtype=str), 'regions': regions,
+            'area_region': area_region, 'countries': np.array(countries, dtype=str), 'continents': continents,
+            'country_continent': country_continent}
+
+
+def save(arrays, digest, path=CACHE_PATH):
+    # written to a temporary file first, so a reader never sees half a cache
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, checksum=np.array(digest), **arrays)
+    os.replace(tmp, path)
+
+
+# the cached arrays if their checksum matches, else None
+def load(digest, path=CACHE_PATH):
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as f:
+        if str(f['checksum']) != digest:
+            return None
+        return {name: f[name] for name in f.files if name != 'checksum'}
+
+
+_reference = None
+
+
+# reference data loaded on first use, rebuilt if the sources changed
+def reference_data(path=CACHE_PATH):
+    global _reference
+    if _reference is None:
+        # without the continent table on disk there is nothing to check yet
+        arrays = load(checksum(), path) if os.path.exists(continent.TABLE_PATH) else None
+        if arrays is None:
+            arrays = build()
+            save(arrays, checksum(), path)
+        _reference = ReferenceData(arrays)
+    return _reference
@@ -0,0 +1,87 @@
+# sample IDs as a keyed permutation of the row number: a Feistel network over
+# the ID range (with cycle walking to stay inside it) maps row i to a distinct
+# ID, so IDs are unique by construction, need no dedup pass or list of used
+# IDs, are computed vectorised for any block of rows, and are the same for the
+# same secret key
+import hashlib
+import os
+import secrets
+
+import numpy as np
+
+
+ROUNDS = 6
+KEY_ENV = 'ANONYMISATION_SID_KEY'
+# one key file per checkout (not per working directory), readable by its owner only
+KEY_FILE = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.sid_key'))
+DIGITS = 10
+
+
+# secret key from the environment, else from KEY_FILE (created on first use)
+def sid_key(path=KEY_FILE):
+    if os.environ.get(KEY_ENV):
+        return os.environ[KEY_ENV].encode()
+    try:
+        # created with mode 0600 and only if it is not there, so two first
+        # runs cannot write different keys
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        pass
+    else:
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(32))
+    if os.stat(path).st_mode & 0o077:
+        os.chmod(path, 0o600)
+    with open(path) as f:
+        key = f.read().strip().encode()
+    if not key:
+        raise ValueError('empty sid key file: ' + path)
+    return key
+
+
+def _round_keys(key, rounds):
+    return [np.uint64(int.from_bytes(hashlib.blake2b(key, digest_size=8, person=b'sid-round-%d' % i).digest(), 'little'))
+            for i in range(rounds)]
+
+
+# keyed mixing of the right half (splitmix64 finaliser), cut to `bits`
+def _mix(x, k, mask):
+    x = x ^ k
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return (x ^ (x >> np.uint64(31))) & mask
+
+
+def _feistel(x, keys, half):
+    mask = np.uint64((1 << half) - 1)
+    left, right = x >> np.uint64(half), x & mask
+    for k in keys:
+        left, right = right, left ^ _mix(right, k, mask)
+    return (left << np.uint64(half)) | right
+
+
+# bijection of [0, n) onto itself; indices outside [0, n) are an error (they
+# would cycle-walk onto values already taken)
+def permute(index, n, key, rounds=ROUNDS):
+    index = np.asarray(index)
+    if index.size and (index.min() < 0 or index.max() >= n):
+        raise ValueError('indices must lie in [0, %d)' % n)
+    half = max(1, (int(n - 1).bit_length() + 1) // 2)
+    keys = _round_keys(key, rounds)
+    x = _feistel(np.asarray(index, dtype='uint64'), keys, half)
+    # cycle walking: values that land outside [0, n) are permuted again
+    out = x >= np.uint64(n)
+    while out.any():
+        x[out] = _feistel(x[out], keys, half)
+        out[out] = x[out] >= np.uint64(n)
+    return x.astype('int64')
+
+
+# IDs of rows start .. start + count - 1, all with `digits` digits; there are
+# 9 * 10^(digits - 1) of them, more rows need more digits
+def sample_ids(start, count, key, digits=DIGITS):
+    low = 10 ** (digits - 1)
+    if start < 0 or start + count > 9 * low:
+        raise ValueError('rows %d .. %d do not fit in %d-digit IDs (at most %d rows)'
+                         % (start, start + count - 1, digits, 9 * low))
+    return low + permute(np.arange(start, start + count), 9 * low, key)
@@ -0,0 +1,125 @@
+# k-anonymity for tables larger than memory: one streaming pass hashes the
+# quasi-identifiers of every row and appends (hash, id) to one of P spill files
+# chosen by the hash, so all rows of an equivalence class land in the same
+# file; each file is then counted on its own (in parallel) and the results
+# are combined into the same k, class histogram and suppression list as
+# kanon.k_anonymity
+#
+# classes are told apart by a 64-bit hash of their values; with n classes the
+# chance of two sharing a hash is about n^2 / 2^65 (negligible for < 10^8)
+#
+# the spill files hold row numbers; with an id column the ids of the
+# suppressed rows are looked up in a last pass over that column only, so it
+# can be of any dtype (e.g. national_insurance_number)
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from anonymisation.storage import read_table_chunks
+
+
+# k, histogram: as kanon.KAnonymity
+# suppressed: row numbers (or ids, in row order) of the rows in classes smaller than the target
+SpillKAnonymity = namedtuple('SpillKAnonymity', ['k', 'histogram', 'suppressed'])
+
+RECORD = np.dtype([('hash', '<u8'), ('row', '<i8')])
+
+
+# 64-bit hash of the quasi-identifier values of every row; the values are
+# hashed as strings so the same combination hashes the same in every chunk,
+# whatever dtype a chunk was read with
+def row_hashes(chunk, qi):
+    return pd.util.hash_pandas_object(chunk[qi].astype(str), index=False).to_numpy()
+
+
+# pass 1: spill (hash, row number) of every row to partition hash % partitions
+def spill(path, qi, spill_dir, partitions, chunksize):
+    files = [open(os.path.join(spill_dir, 'part-%04d.bin' % i), 'wb') for i in range(partitions)]
+    n = 0
+    try:
+        for chunk in read_table_chunks(path, chunksize, columns=qi):
+            records = np.empty(len(chunk), dtype=RECORD)
+            records['hash'] = row_hashes(chunk, qi)
+            records['row'] = np.arange(n, n + len(chunk))
+            part = records['hash'] % np.uint64(partitions)
+            order = np.argsort(part, kind='stable')
+            bounds = np.searchsorted(part[order], np.arange(partitions + 1))
+            for i in range(partitions):
+                if bounds[i] < bounds[i + 1]:
+                    records[order[bounds[i]:bounds[i + 1]]].tofile(files[i])
+            n += len(chunk)
+    finally:
+        for f in files:
+            f.close()
+    return [f.name for f in files], n
+
+
+# pass 2, one partition: class sizes -> histogram and suppressed row numbers
+def count_partition(path, target):
+    records = np.fromfile(path, dtype=RECORD)
+    if len(records) == 0:
+        return {}, np.zeros(0, dtype='int64')
+    _, inverse, counts = np.unique(records['hash'], return_inverse=True, return_counts=True)
+    sizes, classes = np.unique(counts, return_counts=True)
+    return dict(zip(sizes.tolist(), classes.tolist())), records['row'][counts[inverse] < target]
+
+
+# pass 3: values of `column` at the (sorted) row numbers `rows`
+def values_at(path, column, rows, chunksize):
+    values = []
+    n = 0
+    for chunk in read_table_chunks(path, chunksize, columns=[column]):
+        lo, hi = np.searchsorted(rows, [n, n + len(chunk)])
+        values.append(chunk[column].to_numpy()[rows[lo:hi] - n])
+        n += len(chunk)
+    return np.concatenate(values) if values else np.zeros(0, dtype=object)
+
+
+def spill_k_anonymity(path, qi, target=2, chunksize=1000000, partitions=16, processes=None,
+                      spill_dir=None, id_column=None):
+    tmp = tempfile.mkdtemp(prefix='kanon-spill-', dir=spill_dir)
+    try:
+        files, n = spill(path, qi, tmp, partitions, chunksize)
+        if processes == 1:
+            results = [count_partition(f, target) for f in files]
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                results = list(pool.map(count_partition, files, [target] * len(files)))
+    finally:
+        shutil.rmtree(tmp)
+
+    by_size = {}
+    for histogram, _ in results:
+        for size, classes in histogram.items():
+            by_size[size] = by_size.get(size, 0) + classes
+    histogram = pd.Series(by_size, name='classes', dtype='int64').sort_index()
+    histogram.index.name = 'size'
+    suppressed = np.sort(np.concatenate([s for _, s in results])) if results else np.zeros(0, dtype='int64')
+    if id_column:
+        suppressed = values_at(path, id_column, suppressed, chunksize)
+    k = int(histogram.index[0]) if len(histogram) else 0
+    return SpillKAnonymity(k, histogram, suppressed)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='k-anonymity of a table larger than memory')
+    parser.add_argument('path', help='CSV, Parquet or Arrow table')
+    parser.add_argument('qi', nargs='+', help='quasi-identifier columns')
+    parser.add_argument('--k', type=int, default=2, help='target k for the suppression list')
+    parser.add_argument('--id-column', help='report this column for suppressed rows (default: row number)')
+    parser.add_argument('--partitions', type=int, default=16)
+    parser.add_argument('--chunksize', type=int, default=1000000)
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--spill-dir')
+    args = parser.parse_args()
+    r = spill_k_anonymity(args.path, args.qi, args.k, args.chunksize, args.partitions, args.processes,
+                          args.spill_dir, args.id_column)
+    print('k:', r.k)
+    print(r.histogram.head(10))
+    print('suppressed:', len(r.suppressed))
@@ -0,0 +1,69 @@
+# running mean/variance for several numeric columns at once
+# (Welford's update, merged chunk by chunk with Chan et al.'s formula), so the
+# statistics for standardisation need one scan and O(1) memory per column
+import numpy as np
+
+
+class RunningStats:
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        k = len(self.columns)
+        self.n = np.zeros(k)
+        self.mean = np.zeros(k)
+        self.m2 = np.zeros(k)
+
+    # add a chunk (DataFrame holding at least self.columns), missing values are skipped
+    def update(self, chunk):
+        x = chunk[self.columns].to_numpy(dtype='float64')
+        n = np.sum(~np.isnan(x), axis=0).astype('float64')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(n > 0, np.nansum(x, axis=0) / n, 0.0)
+        m2 = np.nansum((x - mean) ** 2, axis=0)
+        self._merge(n, mean, m2)
+        return self
+
+    # combine with statistics gathered on another chunk or by another worker
+    def merge(self, other):
+        if other.columns != self.columns:
+            raise ValueError('cannot merge statistics of different columns')
+        self._merge(other.n, other.mean, other.m2)
+        return self
+
+    def _merge(self, n, mean, m2):
+        total = self.n + n
+        delta = mean - self.mean
+        with np.errstate(invalid='ignore', divide='ignore'):
+            w = np.where(total > 0, n / total, 0.0)
+        self.mean = self.mean + delta * w
+        self.m2 = self.m2 + m2 + delta ** 2 * self.n * w
+        self.n = total
+
+    # plain-JSON state, to carry the statistics over to a later run
+    def to_dict(self):
+        return {'columns': self.columns, 'n': self.n.tolist(), 'mean': self.mean.tolist(), 'm2': self.m2.tolist()}
+
+    @classmethod
+    def from_dict(cls, state):
+        stats = cls(state['columns'])
+        stats.n = np.array(state['n'], dtype='float64')
+        stats.mean = np.array(state['mean'], dtype='float64')
+        stats.m2 = np.array(state['m2'], dtype='float64')
+        return stats
+
+    # sample standard deviation, as Series.std()
+    def sd(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.sqrt(self.m2 / (self.n - 1))
+
+    # mean-sd info in the layout stored in coding.json
+    def info(self):
+        sd = self.sd()
+        return {c: {'mean': float(self.mean[i]), 'sd': float(sd[i])} for i, c in enumerate(self.columns)}
+
+
+# Z-scores for every column in `info` (as returned by RunningStats.info)
+def standardise(chunk, info, suffix='_std'):
+    for c, v in info.items():
+        chunk[c + suffix] = (chunk[c] - v['mean']) / v['sd']
+    return chunk.drop(columns=list(info))
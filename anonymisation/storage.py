@@ -0,0 +1,213 @@
+# reading and writing tables as CSV, Parquet or Arrow IPC (Feather), chosen by
+# file extension; Parquet and Arrow keep the dtypes (categorical codes, float
+# Z-scores) and only the requested columns are read from disk
+# pyarrow is only needed for the columnar formats
+#
+# coded output: columns with a fixed dictionary (list of values) are written as
+# the position of each value in it, in the smallest unsigned integer type; the
+# dictionaries are embedded in the schema metadata (Parquet/Arrow) and written
+# to a shared <file>.dictionary.json next to the table
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+FORMATS = {'.csv': 'csv',
+           '.parquet': 'parquet', '.pq': 'parquet',
+           '.arrow': 'arrow', '.feather': 'arrow', '.ipc': 'arrow'}
+
+
+def table_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in FORMATS:
+        raise ValueError('unknown table format: ' + path)
+    return FORMATS[ext]
+
+
+# same path with another extension, e.g. for output in a chosen format
+def with_format(path, fmt):
+    ext = {'csv': '.csv', 'parquet': '.parquet', 'arrow': '.arrow'}[fmt]
+    return os.path.splitext(path)[0] + ext
+
+
+# whole table, or only `columns`
+def read_table(path, columns=None, dtype=None):
+    fmt = table_format(path)
+    if fmt == 'csv':
+        return pd.read_csv(path, usecols=columns, dtype=dtype)
+    if fmt == 'parquet':
+        df = pd.read_parquet(path, columns=columns)
+    else:
+        df = pd.read_feather(path, columns=columns)
+    return _astype(df, dtype)
+
+
+# iterator of DataFrames of at most `chunksize` rows
+def read_table_chunks(path, chunksize, columns=None, dtype=None):
+    fmt = table_format(path)
+    if fmt == 'csv':
+        yield from pd.read_csv(path, usecols=columns, dtype=dtype, chunksize=chunksize)
+        return
+    for batch in _batches(path, fmt, chunksize, columns):
+        yield _astype(batch.to_pandas(), dtype)
+
+
+# dtypes of the columns that are there (columnar files carry their own dtypes)
+def _astype(df, dtype):
+    if not dtype:
+        return df
+    return df.astype({c: t for c, t in dtype.items() if c in df.columns})
+
+
+def _batches(path, fmt, chunksize, columns):
+    import pyarrow as pa
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        yield from pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns)
+        return
+    with pa.memory_map(path) as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            if columns is not None:
+                batch = batch.select(columns)
+            # record batches can be larger than chunksize
+            for start in range(0, batch.num_rows, chunksize):
+                yield batch.slice(start, chunksize)
+
+
+def write_table(df, path, dictionary=None):
+    with TableWriter(path, dictionary) as writer:
+        writer.write(df)
+
+
+DICTIONARY_KEY = b'anonymisation.dictionary'
+
+
+def dictionary_path(path):
+    return os.path.splitext(path)[0] + '.dictionary.json'
+
+
+# smallest unsigned integer type holding codes 0 .. n - 1
+def code_dtype(n):
+    return np.min_scalar_type(max(n - 1, 0))
+
+
+# position of every value of `s` in `values`, -1 if not there
+def _positions(s, values):
+    index = pd.Index(values)
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        codes = s.cat.codes.to_numpy()
+        return np.where(codes < 0, -1, index.get_indexer(s.cat.categories)[codes])
+    return index.get_indexer(s)
+
+
+# integer codes of `s` in `values`; values outside the dictionary are an error
+def encode(s, values):
+    codes = _positions(s, values)
+    bad = (codes < 0) & s.notna().to_numpy()
+    if bad.any():
+        # the same values with another dtype (cc_status is 0/1 when read
+        # from Parquet or without dtypes, '0'/'1' in the dictionary)
+        codes = _positions(s.astype(str).where(s.notna()), [str(v) for v in values])
+        bad = (codes < 0) & s.notna().to_numpy()
+    if bad.any():
+        raise ValueError('%s: values not in the dictionary: %s' % (s.name, sorted(set(s[bad].astype(str)))[:10]))
+    return codes.astype(code_dtype(len(values)))
+
+
+# the dictionaries of a coded table: from the schema metadata if it has them,
+# else from the .dictionary.json file
+def read_dictionary(path):
+    if table_format(path) != 'csv':
+        import pyarrow as pa
+        if table_format(path) == 'parquet':
+            import pyarrow.parquet as pq
+            metadata = pq.read_schema(path).metadata
+        else:
+            with pa.memory_map(path) as source:
+                metadata = pa.ipc.open_file(source).schema.metadata
+        if metadata and DICTIONARY_KEY in metadata:
+            return json.loads(metadata[DICTIONARY_KEY])
+    with open(dictionary_path(path)) as fp:
+        return json.load(fp)
+
+
+# coded table read back with its coded columns as categoricals (the integer
+# codes are used as they are, values come from the dictionary)
+def read_coded(path, columns=None):
+    dictionary = read_dictionary(path)
+    df = read_table(path, columns=columns)
+    for c, values in dictionary.items():
+        if c in df.columns:
+            df[c] = pd.Categorical.from_codes(df[c].to_numpy().astype('int64'), values)
+    return df
+
+
+# appends DataFrames with the same columns to one file; with `dictionary`
+# (column -> list of values) those columns are written as integer codes, or
+# with encoded=True the DataFrames already hold the codes (e.g. read back from
+# a coded table)
+class TableWriter:
+
+    def __init__(self, path, dictionary=None, encoded=False):
+        self.path = path
+        self.format = table_format(path)
+        self.dictionary = dictionary
+        self.encoded = encoded
+        self.rows = 0
+        self._writer = None
+        self._schema = None
+
+    def write(self, df):
+        if self.dictionary and self.encoded:
+            df = df.assign(**{c: df[c].astype(code_dtype(len(v))) for c, v in self.dictionary.items() if c in df.columns})
+        elif self.dictionary:
+            df = df.assign(**{c: encode(df[c], v) for c, v in self.dictionary.items() if c in df.columns})
+        if self.format == 'csv':
+            df.to_csv(self.path, mode='w' if self.rows == 0 else 'a', header=self.rows == 0, index=False)
+        else:
+            self._write_arrow(df)
+        self.rows += len(df)
+
+    def _write_arrow(self, df):
+        import pyarrow as pa
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            # categoricals get int32 codes so that chunks with more categories
+            # still fit the schema of the first one; Arrow IPC files allow one
+            # dictionary per column only, so there they are stored as values
+            if self.format == 'parquet':
+                self._schema = pa.schema([f.with_type(pa.dictionary(pa.int32(), f.type.value_type))
+                                          if pa.types.is_dictionary(f.type) else f for f in table.schema])
+            else:
+                self._schema = pa.schema([f.with_type(f.type.value_type)
+                                          if pa.types.is_dictionary(f.type) else f for f in table.schema])
+            if self.dictionary:
+                metadata = dict(self._schema.metadata or {})
+                metadata[DICTIONARY_KEY] = json.dumps(self.dictionary).encode()
+                self._schema = self._schema.with_metadata(metadata)
+            if self.format == 'parquet':
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(self.path, self._schema)
+            else:
+                self._writer = pa.ipc.new_file(self.path, self._schema)
+        self._writer.write_table(table.cast(self._schema))
+
+    def close(self):
+        if self.dictionary:
+            with open(dictionary_path(self.path), 'w') as fp:
+                json.dump(self.dictionary, fp, indent = 4)
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        elif self.rows == 0 and self.format == 'csv':
+            open(self.path, 'w').close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,146 @@
+# chunked version of the CDM_CW2_G2.py transforms: the customer extract is read
+# in chunks and every chunk goes through the same per-column transforms, so
+# peak memory depends on the chunk size only (see pipeline.py for the runner
+# that writes the release datasets)
+import os
+
+import numpy as np
+import pandas as pd
+
+from anonymisation.continent import to_continent
+from anonymisation.dates import REFERENCE, age_at, band, edge_labels, parse_iso, quantile_edges
+from anonymisation.loader import read_customers, recode
+from anonymisation.postcode import map_areas, outward_area
+from anonymisation.reference import POSTCODE_PATH, reference_data
+from anonymisation.sid import sample_ids
+from anonymisation.stats import RunningStats
+
+
+# default number of rows held in memory at once
+CHUNKSIZE = 100000
+
+# location of the repo data, relative to this file
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+PATH = os.path.join(ROOT, 'CDM_CW2_G2', 'Data', 'customer_information.csv')
+
+DIRECT_IDENTIFIERS = ['given_name', 'surname', 'phone_number', 'national_insurance_number', 'bank_account_number']
+STD_COLUMNS = ['weight', 'height', 'avg_n_drinks_per_week', 'avg_n_cigret_per_week', 'n_countries_visited']
+
+RES_COLUMNS = ['sid', 'gender', 'age', 'cc_status', 'weight_std', 'height_std', 'blood_group',
+               'avg_n_drinks_per_week_std', 'avg_n_cigret_per_week_std', 'n_countries_visited_std', 'education_level']
+GOV_COLUMNS = ['sid', 'continent_of_birth', 'UK_region', 'cc_status', 'education_level']
+GOV_QI = ['continent_of_birth', 'UK_region', 'education_level']
+
+# coding information, same as CDM_CW2_G2.py
+GENDER_CODE = {'male': 1, 'female': 0}
+BG_CODE = {'B+': 'a', 'O-': 'b', 'O+': 'c', 'A-': 'd', 'A+': 'e', 'AB+': 'f', 'B-': 'g', 'AB-': 'h'}
+EL_CODE = {'college': 'a', 'school': 'b', 'other': 'c'}
+# numeric codes of Researchers_v2.py
+BG_NUMBER = {'B+': 1, 'O-': 2, 'O+': 3, 'A-': 4, 'A+': 5, 'AB+': 6, 'B-': 7, 'AB-': 8}
+EL_NUMBER = {'phD': 1, 'primary': 2, 'bachelor': 3, 'secondary': 4, 'other': 5, 'masters': 6}
+# numeric codes of the education bands of Researchers_v3.py
+EL_RES_NUMBER = {'college': 1, 'school': 2, 'other': 3}
+EL_RES_BANDS = {'primary': 'school', 'secondary': 'school',
+                'bachelor': 'college', 'masters': 'college', 'phD': 'college'}
+EL_GOV_BANDS = {'primary': 'school', 'secondary': 'school',
+                'masters': 'postgraduate', 'phD': 'postgraduate', 'bachelor': 'undergraduate'}
+OVERSEAS = {'Channel Islands': 'Overseas territories', 'Isle of Man': 'Overseas territories'}
+
+# age bands: the quartile edges found by qcut() on the full data are fixed here
+# (age_edges() recomputes them from a histogram of ages in one scan)
+AGE_YEAR = REFERENCE
+AGE_BINS = [-np.inf, 32, 43, 55, np.inf]
+AGE_LABELS = ['18-32', '33-43', '44-55', '55+']
+
+
+# labels of age bands: the coursework labels for the fixed edges, else built
+# from the edges
+def age_labels(bins):
+    return AGE_LABELS if list(bins) == AGE_BINS else edge_labels(bins)
+
+
+# dictionary for postcode area -> UK country, overseas islands combined
+def load_area_to_country(path=POSTCODE_PATH):
+    if path == POSTCODE_PATH:
+        area_to_country = reference_data().area_to_country()
+    else:
+        postcode_country = pd.read_csv(path)
+        area_to_country = dict(zip(postcode_country['Postcode area'], postcode_country['Country']))
+    return {area: OVERSEAS.get(country, country) for area, country in area_to_country.items()}
+
+
+# read the extract in chunks of `chunksize` rows
+def read_chunks(path=PATH, chunksize=CHUNKSIZE, usecols=None):
+    return read_customers(path, usecols=usecols, chunksize=chunksize)
+
+
+# sample IDs of rows start .. start + len(chunk) - 1 (keyed permutation of the
+# row number, unique without keeping the used IDs in memory)
+def assign_sid(chunk, start, key):
+    chunk.insert(0, 'sid', sample_ids(start, len(chunk), key))
+    return chunk
+
+
+############### per-chunk transforms ###############
+
+def code_gender(chunk):
+    chunk['gender'] = np.where(chunk['gender'] == 'M', 1, 0)
+    return chunk
+
+
+def derive_age(chunk, year=AGE_YEAR, bins=AGE_BINS):
+    # parse the ISO birthdate, subtract and band with the fixed edges
+    age = band(age_at(parse_iso(chunk['birthdate']), year), bins, age_labels(bins))
+    chunk.insert(chunk.columns.get_loc('birthdate'), 'age', age)
+    return chunk.drop(columns='birthdate')
+
+
+def code_blood_group(chunk):
+    chunk['blood_group'] = recode(chunk['blood_group'], BG_CODE)
+    return chunk
+
+
+def code_education(chunk):
+    chunk['education_level'] = recode(recode(chunk['education_level'], EL_RES_BANDS), EL_CODE)
+    return chunk
+
+
+def band_education_gov(chunk):
+    chunk['education_level'] = recode(chunk['education_level'], EL_GOV_BANDS)
+    return chunk
+
+
+def continent_of_birth(chunk):
+    chunk['continent_of_birth'] = to_continent(chunk['country_of_birth'])
+    return chunk.drop(columns='country_of_birth')
+
+
+def band_postcode(chunk, area_to_country):
+    # keep characters before first digit, convert to UK country and combine overseas islands
+    area = outward_area(chunk['postcode'])
+    chunk['UK_region'] = map_areas(area, area_to_country)
+    return chunk.drop(columns='postcode')
+
+
+############### standardisation ###############
+
+# pass 1: mean/sd of all standardised columns in a single scan
+def column_stats(path=PATH, columns=STD_COLUMNS, chunksize=CHUNKSIZE):
+    stats = RunningStats(columns)
+    for chunk in read_chunks(path, chunksize, usecols=columns):
+        stats.update(chunk)
+    return stats.info()
+
+
+# quartile edges of age over the whole extract (the bins qcut() would use),
+# from a histogram of ages accumulated chunk by chunk
+def age_edges(path=PATH, reference=AGE_YEAR, q=4, chunksize=CHUNKSIZE):
+    counts = np.zeros(0, dtype=np.int64)
+    for chunk in read_chunks(path, chunksize, usecols=['birthdate']):
+        age = age_at(parse_iso(chunk['birthdate']), reference)
+        age = age[~np.isnan(age)].astype(np.int64) if age.dtype.kind == 'f' else age
+        chunk_counts = np.bincount(age[age >= 0])
+        if len(chunk_counts) > len(counts):
+            counts = np.pad(counts, (0, len(chunk_counts) - len(counts)))
+        counts[:len(chunk_counts)] += chunk_counts
+    return list(quantile_edges(counts, q))
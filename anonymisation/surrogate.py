@@ -0,0 +1,83 @@
+# surrogate postcodes without a Faker call per value: every syntactically valid
+# postcode of the form <area><district> <sector><unit letters> is numbered, and
+# a pool of n surrogates is n consecutive positions of a keyed permutation of
+# that numbering (sid.permute), so surrogates are distinct by construction and
+# the whole pool is built with array operations; a column is then replaced
+# through its categorical codes
+import secrets
+
+import numpy as np
+import pandas as pd
+
+from anonymisation.sid import permute
+
+
+# letters used in the unit part of the inward code (Royal Mail never uses C I K M O V there)
+UNIT_LETTERS = np.array(list('ABDEFGHJLNPQRSTUWXYZ'), dtype=object)
+DISTRICTS = 99
+SECTORS = 10
+
+
+# postcode areas of the UK (AB, AL, B, ...) from the postcode -> country table
+def postcode_areas(path=None):
+    if path is None:
+        from anonymisation.reference import reference_data
+        return reference_data().areas.to_numpy(dtype=object)
+    return pd.read_csv(path)['Postcode area'].to_numpy(dtype=object)
+
+
+# number of distinct postcodes the pool can draw from
+def pool_size(areas):
+    return len(areas) * DISTRICTS * SECTORS * len(UNIT_LETTERS) ** 2
+
+
+# postcodes numbered 0 .. pool_size(areas) - 1
+def decode(index, areas):
+    index = np.asarray(index, dtype='int64')
+    n_letters = len(UNIT_LETTERS)
+    index, second = np.divmod(index, n_letters)
+    index, first = np.divmod(index, n_letters)
+    index, sector = np.divmod(index, SECTORS)
+    area, district = np.divmod(index, DISTRICTS)
+    districts = np.array([str(d + 1) for d in range(DISTRICTS)], dtype=object)
+    sectors = np.array([' %d' % s for s in range(SECTORS)], dtype=object)
+    return areas[area] + districts[district] + sectors[sector] + UNIT_LETTERS[first] + UNIT_LETTERS[second]
+
+
+# n distinct surrogate postcodes; the same key gives the same pool, without a
+# key every call draws a new one (like Faker)
+def postcode_pool(n, key=None, areas=None):
+    areas = postcode_areas() if areas is None else np.asarray(areas, dtype=object)
+    size = pool_size(areas)
+    if n > size:
+        raise ValueError('%d surrogates requested, only %d distinct postcodes' % (n, size))
+    key = secrets.token_bytes(32) if key is None else key
+    return decode(permute(np.arange(n), size, key), areas)
+
+
+# replace every distinct value of a column with its own surrogate postcode;
+# returns the new column (categorical) and the value -> surrogate dictionary
+def pseudonymise_postcodes(values, key=None, areas=None):
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+    else:
+        codes, uniques = pd.factorize(values)
+    pool = postcode_pool(len(uniques), key, areas)
+    column = pd.Series(pd.Categorical.from_codes(codes, pool), index=values.index, name=values.name)
+    return column, dict(zip(uniques.tolist(), pool.tolist()))
+
+
+# surrogate of each value from its position in a fixed domain (e.g. every
+# postcode area): the same value always gets the same surrogate for the same
+# key, in any chunk or run, without a stored dictionary
+def keyed_postcodes(values, key, domain, areas=None):
+    areas = postcode_areas() if areas is None else np.asarray(areas, dtype=object)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+    else:
+        codes, uniques = pd.factorize(values)
+    rank = pd.Index(domain).get_indexer(uniques)
+    if (rank < 0).any():
+        raise ValueError('values not in the domain: %s' % list(uniques[rank < 0][:10]))
+    pool = decode(permute(rank, pool_size(areas), key), areas)
+    return pd.Series(pd.Categorical.from_codes(codes, pool), index=values.index, name=values.name)
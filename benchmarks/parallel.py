@@ -0,0 +1,40 @@
+# per-column transforms of CDM_CW2_G2.py called one after the other vs in the
+# process pool of anonymisation.parallel, on the first N rows of an extract;
+# the speedup needs as many cores as processes (os.cpu_count() is printed)
+# usage: python benchmarks/parallel.py EXTRACT [N_ROWS] [--processes P ...]
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from anonymisation.parallel import cdm_tasks, run_parallel
+from anonymisation.streaming import load_area_to_country
+
+
+def timed(f, *args):
+    t = time.perf_counter()
+    out = f(*args)
+    return out, time.perf_counter() - t
+
+
+def serial(df, tasks):
+    return pd.concat([task.func(df[task.inputs]) for task in tasks.values()], axis=1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='serial vs process pool column transforms')
+    parser.add_argument('path', help='CSV extract, e.g. from benchmarks/synthetic.py')
+    parser.add_argument('rows', type=float, nargs='?')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+    df = pd.read_csv(args.path, nrows=None if args.rows is None else int(args.rows))
+    tasks = cdm_tasks(load_area_to_country())
+    expected, t_serial = timed(serial, df, tasks)
+    print('%d rows, %s cores  serial: %6.2fs' % (len(df), os.cpu_count(), t_serial))
+    for p in args.processes:
+        (out, _), t = timed(run_parallel, df, tasks, p)
+        assert out.astype(str).equals(expected.astype(str))
+        print('%d processes: %6.2fs  x%.2f' % (p, t, t_serial / t))
@@ -0,0 +1,178 @@
+# time and peak memory of each stage of the CDM_CW2_G2.py pipeline on
+# synthetic extracts (see synthetic.py), to catch regressions
+# usage: python benchmarks/pipeline.py [--rows 1e4 1e5 ...] [--json OUT]
+#                                      [--compare BASELINE --tolerance 0.25]
+#                                      [--trace-memory]
+# memory of each stage: its peak RSS (on Linux the high-water mark is reset
+# before every stage through /proc/self/clear_refs; elsewhere only the rise of
+# the process high-water mark is known) and the change of RSS it leaves behind;
+# with --trace-memory the peak of each stage is measured with tracemalloc
+# instead, which counts Python allocations only and slows the stages down
+# several times
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from anonymisation import streaming
+from anonymisation.continent import to_continent
+from anonymisation.kanon import k_anonymity
+from anonymisation.loader import read_customers, recode
+from anonymisation.postcode import map_areas, outward_area
+from anonymisation.sid import sample_ids
+from anonymisation.stats import RunningStats, standardise
+from anonymisation.storage import write_table
+from synthetic import generate
+
+
+def stages(path, out_dir):
+    df = {}
+    area_to_country = streaming.load_area_to_country()
+
+    def load():
+        df['raw'] = read_customers(path)
+        df['raw'].insert(0, 'sid', sample_ids(0, len(df['raw']), b'benchmark'))
+
+    def coding():
+        raw = df['raw']
+        res = raw.drop(columns=streaming.DIRECT_IDENTIFIERS + ['country_of_birth', 'current_country', 'postcode'])
+        res = streaming.code_gender(res)
+        res['blood_group'] = recode(res['blood_group'], streaming.BG_CODE)
+        res['education_level'] = recode(recode(res['education_level'], streaming.EL_RES_BANDS), streaming.EL_CODE)
+        df['res'] = streaming.derive_age(res)
+
+    def standardisation():
+        info = RunningStats(streaming.STD_COLUMNS).update(df['res']).info()
+        df['res'] = standardise(df['res'], info)
+
+    def continent():
+        df['continent'] = to_continent(df['raw']['country_of_birth'])
+
+    def postcode():
+        df['region'] = map_areas(outward_area(df['raw']['postcode']), area_to_country)
+
+    def kanonymity():
+        raw = df['raw']
+        gov = raw[['sid', 'cc_status']].assign(continent_of_birth=df['continent'], UK_region=df['region'],
+                                               education_level=recode(raw['education_level'], streaming.EL_GOV_BANDS))
+        df['gov'] = gov[~k_anonymity(gov, streaming.GOV_QI).suppress]
+
+    def export():
+        write_table(df['res'][streaming.RES_COLUMNS], os.path.join(out_dir, 'researchers_dataset.csv'))
+        write_table(df['gov'][streaming.GOV_COLUMNS], os.path.join(out_dir, 'gov_dataset.csv'))
+
+    return [('load', load), ('coding', coding), ('standardise', standardisation), ('continent', continent),
+            ('postcode', postcode), ('k-anonymity', kanonymity), ('export', export)]
+
+
+def _status_mb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024
+    return None
+
+
+# reset the RSS high-water mark; False where that is not possible
+def reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+# process high-water mark in MB (ru_maxrss is in KB on Linux)
+def peak_rss():
+    try:
+        return _status_mb('VmHWM')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# current RSS in MB, or None if it cannot be read
+def current_rss():
+    try:
+        return _status_mb('VmRSS')
+    except OSError:
+        return None
+
+
+# {stage: {'seconds': .., 'peak_mb': .., 'rss_change_mb': ..}} for one extract;
+# peak_mb is the stage's own peak RSS where the high-water mark can be reset,
+# else how much the stage raised it
+def run(path, trace_memory=False):
+    results = {}
+    with tempfile.TemporaryDirectory() as out_dir:
+        if trace_memory:
+            tracemalloc.start()
+        for name, f in stages(path, out_dir):
+            rss, before = current_rss(), None
+            if trace_memory:
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+            elif not reset_peak_rss():
+                before = peak_rss()
+            t = time.perf_counter()
+            f()
+            seconds = time.perf_counter() - t
+            if trace_memory:
+                peak = (tracemalloc.get_traced_memory()[1] - before) / 2 ** 20
+            elif before is None:
+                peak = peak_rss()
+            else:
+                peak = peak_rss() - before
+            change = None if rss is None else current_rss() - rss
+            results[name] = {'seconds': seconds, 'peak_mb': peak, 'rss_change_mb': change}
+        if trace_memory:
+            tracemalloc.stop()
+    return results
+
+
+# stages slower than the baseline by more than `tolerance`
+def regressions(results, baseline, tolerance):
+    slow = []
+    for rows, stages in results.items():
+        for name, r in stages.items():
+            base = baseline.get(rows, {}).get(name)
+            if base and r['seconds'] > base['seconds'] * (1 + tolerance):
+                slow.append((rows, name, base['seconds'], r['seconds']))
+    return slow
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='stage timings of the anonymisation pipeline')
+    parser.add_argument('--rows', type=float, nargs='+', default=[1e4, 1e5, 1e6])
+    parser.add_argument('--data-dir', default=tempfile.gettempdir(), help='where synthetic extracts are kept')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='baseline results (JSON) to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--trace-memory', action='store_true', help='per-stage peak with tracemalloc (slow)')
+    args = parser.parse_args()
+
+    results = {}
+    for rows in map(int, args.rows):
+        path = os.path.join(args.data_dir, 'customers_%d.csv' % rows)
+        if not os.path.exists(path):
+            generate(rows, path)
+        results[str(rows)] = run(path, args.trace_memory)
+        print('%d rows' % rows)
+        for name, r in results[str(rows)].items():
+            change = '' if r['rss_change_mb'] is None else '%+10.1f MB' % r['rss_change_mb']
+            print('  %-12s %9.3fs  peak %10.1f MB  change %s' % (name, r['seconds'], r['peak_mb'], change))
+
+    if args.json:
+        with open(args.json, 'w') as fp:
+            json.dump(results, fp, indent = 4)
+    if args.compare:
+        with open(args.compare) as fp:
+            slow = regressions(results, json.load(fp), args.tolerance)
+        for rows, name, before, after in slow:
+            print('regression: %s rows, %s: %.3fs -> %.3fs' % (rows, name, before, after))
+        sys.exit(1 if slow else 0)
@@ -0,0 +1,58 @@
+# throughput of postcode banding: apply-based path of the scripts vs the
+# vectorised path in anonymisation.postcode
+# usage: python benchmarks/postcode.py [N_ROWS ...]   (default 1000000 10000000)
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from anonymisation.postcode import map_areas, outward_area
+from anonymisation.streaming import load_area_to_country
+
+
+# random UK-style postcodes over the areas of postcode_country.csv
+def fake_postcodes(n, areas, seed=0):
+    rng = np.random.default_rng(seed)
+    letters = np.array(list('ABDEFGHJLNPQRSTUWXYZ'))
+    area = np.asarray(areas, dtype=object)[rng.integers(0, len(areas), n)]
+    district = rng.integers(1, 30, n).astype(str).astype(object)
+    sector = rng.integers(0, 10, n).astype(str).astype(object)
+    unit = letters[rng.integers(0, len(letters), n)].astype(object) + letters[rng.integers(0, len(letters), n)]
+    return pd.Series(area + district + ' ' + sector + unit)
+
+
+# define function for finding index of first numerical digit (as in the scripts)
+def find_first_digit(s):
+    for i, c in enumerate(s):
+        if c.isdigit():
+            return i
+
+
+def apply_path(postcodes, area_to_country):
+    area = postcodes.apply(lambda x: x[:find_first_digit(x)])
+    return area.replace(area_to_country)
+
+
+def vectorised_path(postcodes, area_to_country):
+    return map_areas(outward_area(postcodes), area_to_country)
+
+
+def timed(f, *args):
+    t = time.perf_counter()
+    out = f(*args)
+    return out, time.perf_counter() - t
+
+
+if __name__ == '__main__':
+    sizes = [int(a) for a in sys.argv[1:]] or [1000000, 10000000]
+    area_to_country = load_area_to_country()
+    for n in sizes:
+        postcodes = fake_postcodes(n, list(area_to_country))
+        a, t_apply = timed(apply_path, postcodes, area_to_country)
+        v, t_vec = timed(vectorised_path, postcodes, area_to_country)
+        assert a.equals(v)
+        print('%11d rows  apply: %7.2fs (%5.2f M rows/s)  vectorised: %7.2fs (%5.2f M rows/s)  x%.1f'
+              % (n, t_apply, n / t_apply / 1e6, t_vec, n / t_vec / 1e6, t_apply / t_vec))
@@ -0,0 +1,91 @@
+# synthetic customer_information extracts with the same 18-column schema:
+# names from the real extract, countries from the continent table (including
+# the override lists), postcodes in the areas of postcode_country.csv and
+# unique national insurance numbers; written chunk by chunk, so 10^8 rows need
+# no more memory than 10^6
+# usage: python benchmarks/synthetic.py N_ROWS OUT_PATH [--seed S]
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from anonymisation.continent import OVERRIDES, continent_table
+from anonymisation.storage import TableWriter
+from anonymisation.streaming import BG_CODE, EL_RES_BANDS, PATH, load_area_to_country
+
+
+CHUNK = 1000000
+LETTERS = np.array(list('ABDEFGHJLNPQRSTUWXYZ'))
+
+
+def _pick(rng, values, n, p=None):
+    return np.asarray(values, dtype=object)[rng.choice(len(values), n, p=p)]
+
+
+def _digits(rng, n, width):
+    return pd.Series(rng.integers(0, 10 ** width, n)).astype(str).str.zfill(width).to_numpy(dtype=object)
+
+
+# one chunk of rows start .. start + n - 1
+def customers(start, n, rng, pools):
+    idx = np.arange(start, start + n)
+    area = _pick(rng, pools['areas'], n)
+    postcode = (area + rng.integers(1, 30, n).astype(str).astype(object) + ' '
+                + rng.integers(0, 10, n).astype(str).astype(object)
+                + _pick(rng, LETTERS, n) + _pick(rng, LETTERS, n))
+    # NI numbers: two letters from the row number's millions, six digits from the rest
+    prefix = LETTERS[idx // 1000000 // len(LETTERS) % len(LETTERS)].astype(object) + LETTERS[idx // 1000000 % len(LETTERS)]
+    ni = prefix + ' ' + pd.Series(idx % 1000000).astype(str).str.zfill(6).to_numpy(dtype=object) + ' T'
+    birthdate = np.datetime64('1930-01-01') + rng.integers(0, 365 * 74, n).astype('timedelta64[D]')
+    return pd.DataFrame({
+        'given_name': _pick(rng, pools['given_name'], n),
+        'surname': _pick(rng, pools['surname'], n),
+        'gender': _pick(rng, ['M', 'F'], n),
+        'birthdate': birthdate.astype(str),
+        'country_of_birth': _pick(rng, pools['countries'], n),
+        'current_country': 'United Kingdom',
+        'phone_number': '(07700) 900' + _digits(rng, n, 3),
+        'postcode': postcode,
+        'national_insurance_number': ni,
+        'bank_account_number': _digits(rng, n, 8),
+        'cc_status': (rng.random(n) < 0.05).astype(int),
+        'weight': rng.normal(67, 19, n).clip(35, 160).round(1),
+        'height': rng.normal(1.70, 0.175, n).clip(1.2, 2.2).round(2),
+        'blood_group': _pick(rng, list(BG_CODE), n),
+        'avg_n_drinks_per_week': rng.uniform(0, 10, n).round(1),
+        'avg_n_cigret_per_week': rng.uniform(0, 500, n).round(1),
+        'education_level': _pick(rng, pools['education'], n, pools['education_p']),
+        'n_countries_visited': rng.integers(0, 50, n),
+    })
+
+
+def pools():
+    real = pd.read_csv(PATH, usecols=['given_name', 'surname', 'education_level'])
+    education = real['education_level'].value_counts(normalize=True)
+    countries = sorted(set(continent_table()) | set(OVERRIDES))
+    assert set(education.index) <= set(EL_RES_BANDS) | {'other'}
+    return {'given_name': real['given_name'].unique(), 'surname': real['surname'].unique(),
+            'education': list(education.index), 'education_p': education.to_numpy(),
+            'countries': countries, 'areas': sorted(load_area_to_country())}
+
+
+# write n rows to path (CSV, Parquet or Arrow by extension)
+def generate(n, path, seed=0, chunk=CHUNK):
+    rng = np.random.default_rng(seed)
+    p = pools()
+    with TableWriter(path) as out:
+        for start in range(0, n, chunk):
+            out.write(customers(start, min(chunk, n - start), rng, p))
+    return path
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='synthetic customer_information extract')
+    parser.add_argument('rows', type=float, help='number of rows, e.g. 1e6')
+    parser.add_argument('out')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    generate(int(args.rows), args.out, args.seed)
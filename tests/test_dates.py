@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from anonymisation import streaming
+from anonymisation.dates import ages, edge_labels, parse_iso
+
+
+def test_labels_follow_the_edges():
+    assert streaming.age_labels(streaming.AGE_BINS) == streaming.AGE_LABELS
+    assert edge_labels([-np.inf, 37, 56, 74, np.inf]) == ['<=37', '38-56', '57-74', '75+']
+    assert edge_labels([-np.inf, 32.5, 33, np.inf]) == ['<=32', '33', '34+']
+
+
+@pytest.mark.parametrize('value', ['1990-13-45', '1990-04-31', '1900-02-29', '1990-00-10', '12/05/1990'])
+def test_invalid_dates_are_an_error(value):
+    with pytest.raises(ValueError, match=value):
+        parse_iso(pd.Series(['1990-05-12', value], name='birthdate'))
+
+
+def test_dates_with_a_time_and_missing_dates():
+    dates = pd.Series(['1990-05-12 00:00:00', '2000-02-29', None], name='birthdate')
+    assert ages(dates, '2022-05-12').tolist()[:2] == [32, 22]
+    assert np.isnan(ages(dates, 2022).iloc[2])
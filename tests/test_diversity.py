@@ -0,0 +1,16 @@
+import pandas as pd
+
+from anonymisation import streaming
+from anonymisation.diversity import privacy_report
+from anonymisation.kanon import k_anonymity
+
+
+QI = ['gender', 'education_level']
+
+
+def test_empty_table_gives_an_empty_report():
+    df = pd.read_csv(streaming.PATH).iloc[:0]
+    report = privacy_report(df, QI)
+    assert report.k == k_anonymity(df, QI).k == 0
+    assert report.classes.empty and report.violations.empty
+    assert list(report.classes.columns) == QI + ['size', 'distinct_l', 'entropy_l', 't']
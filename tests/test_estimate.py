@@ -0,0 +1,27 @@
+import pandas as pd
+
+from anonymisation import streaming
+from anonymisation.estimate import estimate_k, sample_frame
+from anonymisation.kanon import k_anonymity
+
+
+QI = ['country_of_birth', 'gender', 'education_level']
+
+
+def test_full_sample_is_exact():
+    df = pd.read_csv(streaming.PATH, usecols=QI)
+    exact = k_anonymity(df, QI, target=5)
+    e = estimate_k(df, QI, len(df), target=5)
+    assert e.k_at_most == exact.k
+    assert e.suppressed == e.suppressed_at_most == exact.suppress.sum()
+
+
+def test_bounds_hold_on_a_sample():
+    df = pd.read_csv(streaming.PATH, usecols=QI)
+    exact = k_anonymity(df, QI, target=5)
+    for seed in range(5):
+        e = estimate_k(sample_frame(df, 0.2, seed), QI, len(df), target=5)
+        assert e.k_at_most >= exact.k
+        assert e.suppressed <= e.suppressed_at_most
+        assert e.suppressed_at_most >= exact.suppress.sum()
+        assert 0 <= e.classes <= len(df)
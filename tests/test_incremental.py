@@ -0,0 +1,72 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from anonymisation import incremental, pipeline, streaming
+from anonymisation.storage import read_table
+
+
+KEY = b'test key'
+PROFILES = ['researchers', 'government', 'direct_identifiers']
+
+
+@pytest.fixture
+def extract(tmp_path):
+    df = pd.read_csv(streaming.PATH)
+    paths = {}
+    for name, rows in [('full', df.iloc[:600]), ('first', df.iloc[:400]),
+                       # 50 customers already released plus 100 new ones
+                       ('second', df.iloc[350:500])]:
+        paths[name] = str(tmp_path / (name + '.csv'))
+        rows.to_csv(paths[name], index=False)
+    return paths
+
+
+def test_delta_after_full_run_is_refused(tmp_path, extract):
+    out_dir = tmp_path / 'out'
+    out_dir.mkdir()
+    pipeline.run(PROFILES, str(out_dir), extract['full'], key=KEY)
+    before = {f: (out_dir / f).read_bytes() for f in os.listdir(out_dir)}
+    with pytest.raises(ValueError, match='not written by an incremental run'):
+        incremental.update(extract['second'], str(out_dir), str(tmp_path / 'state'), PROFILES, key=KEY)
+    assert {f: (out_dir / f).read_bytes() for f in os.listdir(out_dir)} == before
+
+
+def test_deltas_keep_sids_unique_and_coding_frozen(tmp_path, extract):
+    out_dir, state_dir = tmp_path / 'out', str(tmp_path / 'state')
+    out_dir.mkdir()
+    incremental.update(extract['first'], str(out_dir), state_dir, PROFILES, key=KEY)
+    coding = json.loads((out_dir / 'coding.json').read_text())
+    incremental.update(extract['second'], str(out_dir), state_dir, PROFILES, key=KEY)
+
+    researchers = pd.read_csv(out_dir / 'researchers_dataset.csv')
+    assert len(researchers) == 500
+    assert researchers['sid'].is_unique
+    assert pd.read_csv(out_dir / 'gov_dataset.csv')['sid'].is_unique
+    assert json.loads((out_dir / 'coding.json').read_text()) == coding
+
+
+@pytest.mark.parametrize('fmt', ['parquet', 'arrow'])
+def test_columnar_releases_are_appended_in_chunks(tmp_path, extract, fmt):
+    csv_dir, out_dir, state_dir = tmp_path / 'csv', tmp_path / 'out', str(tmp_path / 'state')
+    csv_dir.mkdir()
+    out_dir.mkdir()
+    for path in [extract['first'], extract['second']]:
+        incremental.update(path, str(csv_dir), str(tmp_path / 'csv_state'), PROFILES, key=KEY)
+        incremental.update(path, str(out_dir), state_dir, PROFILES, fmt=fmt, key=KEY, chunksize=64)
+    for name in ['researchers_dataset', 'gov_dataset', 'direct_identifiers']:
+        expected = pd.read_csv(csv_dir / (name + '.csv'), float_precision='round_trip')
+        got = read_table(str(out_dir / (name + '.' + fmt)))
+        assert (got.astype(str).to_numpy() == expected.astype(str).to_numpy()).all()
+    assert not [f for f in os.listdir(out_dir) if '.tmp' in f]
+
+
+def test_changed_release_is_refused(tmp_path, extract):
+    out_dir, state_dir = tmp_path / 'out', str(tmp_path / 'state')
+    out_dir.mkdir()
+    incremental.update(extract['first'], str(out_dir), state_dir, PROFILES, key=KEY)
+    pipeline.run(PROFILES, str(out_dir), extract['full'], key=KEY)
+    with pytest.raises(ValueError, match='changed since the last incremental run'):
+        incremental.update(extract['second'], str(out_dir), state_dir, PROFILES, key=KEY)
@@ -0,0 +1,24 @@
+import pandas as pd
+import pytest
+
+from anonymisation import mondrian, streaming
+from anonymisation.dates import ages
+
+
+@pytest.fixture
+def researchers():
+    df = pd.read_csv(streaming.PATH)
+    df['age'] = ages(df['birthdate'], 2022)
+    return df[['gender', 'age', 'weight', 'height', 'education_level', 'cc_status']]
+
+
+@pytest.mark.parametrize('k', [2, 10])
+def test_output_is_k_anonymous_with_gender(researchers, k):
+    out, _ = mondrian.mondrian_bands(researchers, k)
+    assert out.groupby(mondrian.QI).size().min() >= k
+    assert out.groupby(['gender', 'age', 'education_level']).size().min() >= k
+
+
+def test_gender_left_unpartitioned_is_refused(researchers):
+    with pytest.raises(ValueError, match='gender'):
+        mondrian.mondrian_bands(researchers, 5, qi=['age', 'weight', 'height'])
@@ -0,0 +1,47 @@
+import os
+
+import pandas as pd
+import pytest
+
+from anonymisation import pipeline, streaming
+from anonymisation.storage import read_coded
+
+
+KEY = b'test key'
+PROFILES = ['researchers', 'government']
+
+
+@pytest.fixture
+def extracts(tmp_path):
+    df = pd.read_csv(streaming.PATH)
+    paths = {'csv': str(tmp_path / 'extract.csv'), 'parquet': str(tmp_path / 'extract.parquet')}
+    df.to_csv(paths['csv'], index=False)
+    df.to_parquet(paths['parquet'])
+    return paths
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'parquet'])
+def test_coded_output_reads_back_as_plain_output(tmp_path, extracts, fmt):
+    plain, coded = tmp_path / 'plain', tmp_path / 'coded'
+    plain.mkdir()
+    coded.mkdir()
+    pipeline.run(PROFILES, str(plain), extracts[fmt], fmt=fmt, key=KEY)
+    n, removed = pipeline.run(PROFILES, str(coded), extracts[fmt], fmt=fmt, key=KEY, coded=True)
+    assert removed == {'government': 27}
+    for name in ['researchers_dataset', 'gov_dataset']:
+        expected = pd.read_csv(plain / (name + '.csv')) if fmt == 'csv' else pd.read_parquet(plain / (name + '.parquet'))
+        got = read_coded(str(coded / (name + '.' + fmt)))
+        assert len(got) == len(expected)
+        assert (got.astype(str).to_numpy() == expected.astype(str).to_numpy()).all()
+    assert not [f for f in os.listdir(coded) if '.tmp' in f or '.classes' in f]
+
+
+def test_failed_run_leaves_nothing_behind(tmp_path, extracts, monkeypatch):
+    out_dir = tmp_path / 'out'
+    out_dir.mkdir()
+    government = pipeline.PROFILES['government']
+    categories = dict(government.categories, cc_status=['1'])
+    monkeypatch.setitem(pipeline.PROFILES, 'government', government._replace(categories=categories))
+    with pytest.raises(ValueError, match='not in the dictionary'):
+        pipeline.run(PROFILES, str(out_dir), extracts['csv'], key=KEY, coded=True)
+    assert os.listdir(out_dir) == []
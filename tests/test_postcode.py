@@ -0,0 +1,15 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from anonymisation.postcode import outward_area
+
+
+POSTCODES = ['LS5 8FN', None, 'M0U 1RA', np.nan, 'SO1 8HZ', 'GIR']
+
+
+@pytest.mark.parametrize('dtype', [object, 'str', 'category'])
+def test_missing_postcodes_give_missing_areas(dtype):
+    areas = outward_area(pd.Series(POSTCODES, dtype=dtype, name='postcode'))
+    assert areas.isna().tolist() == [False, True, False, True, False, False]
+    assert areas.dropna().astype(str).tolist() == ['LS', 'M', 'SO', 'GIR']
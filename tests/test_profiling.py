@@ -0,0 +1,24 @@
+import json
+
+from anonymisation import profiling
+
+
+def test_stage_report(tmp_path):
+    profiler = profiling.Profiler()
+    with profiler.stage('read', rows=10):
+        pass
+    profiler.write(str(tmp_path / 'profile.json'))
+    stage = json.loads((tmp_path / 'profile.json').read_text())['stages']['read']
+    assert stage['calls'] == 1 and stage['rows'] == 10
+    assert stage['peak_rss_mb'] > 0
+
+
+def test_memory_is_null_when_it_cannot_be_measured(monkeypatch):
+    monkeypatch.setattr(profiling, 'rss', lambda: None)
+    profiler = profiling.Profiler()
+    for _ in range(2):
+        with profiler.stage('read'):
+            pass
+    stage = profiler.report()['stages']['read']
+    assert stage['calls'] == 2
+    assert stage['mem_delta_mb'] is None and stage['peak_rss_mb'] is None
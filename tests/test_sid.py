@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+
+from anonymisation.sid import permute, sample_ids
+
+
+def test_ids_are_distinct_up_to_the_range():
+    ids = sample_ids(0, 90, b'k', digits=2)
+    assert len(set(ids)) == 90 and ids.min() >= 10 and ids.max() <= 99
+
+
+def test_rows_beyond_the_range_are_an_error():
+    with pytest.raises(ValueError, match='do not fit'):
+        sample_ids(0, 200, b'k', digits=2)
+    with pytest.raises(ValueError, match='do not fit'):
+        sample_ids(85, 10, b'k', digits=2)
+    with pytest.raises(ValueError):
+        permute(np.arange(11), 10, b'k')
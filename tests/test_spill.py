@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from anonymisation import streaming
+from anonymisation.kanon import k_anonymity
+from anonymisation.spill import spill_k_anonymity
+
+
+QI = ['gender', 'blood_group', 'education_level']
+
+
+@pytest.fixture
+def extract(tmp_path):
+    df = pd.read_csv(streaming.PATH)
+    df.to_parquet(tmp_path / 'extract.parquet')
+    return df, str(tmp_path / 'extract.parquet')
+
+
+def test_same_as_in_memory(extract):
+    df, path = extract
+    expected = k_anonymity(df, QI, target=20)
+    got = spill_k_anonymity(path, QI, target=20, chunksize=128, partitions=4, processes=1)
+    assert got.k == expected.k
+    assert got.histogram.to_dict() == expected.histogram.to_dict()
+    assert got.suppressed.tolist() == np.flatnonzero(expected.suppress).tolist()
+
+
+def test_ids_of_any_dtype(extract):
+    df, path = extract
+    rows = np.flatnonzero(k_anonymity(df, QI, target=20).suppress)
+    got = spill_k_anonymity(path, QI, target=20, chunksize=128, partitions=4, processes=1,
+                            id_column='national_insurance_number')
+    assert list(got.suppressed) == df['national_insurance_number'].iloc[rows].tolist()